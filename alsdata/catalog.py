@@ -0,0 +1,212 @@
+"""
+On-disk catalog of extracted schemas, in a SQLite database, with an
+inverted index from each field (path and type) to the schemas, and so the
+collections, that have it.
+
+Paths are those of :meth:`alsdata.core.Schema.paths`, e.g. "fs.date" or
+"numbers[].num". Queries can use the wildcards ``*`` (any characters)
+and ``?`` (one character), e.g. "fs.*".
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+from bson import json_util
+from .core import Schema
+
+#: Version of the database layout
+CATALOG_VERSION = 2
+
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS collections (
+    id INTEGER PRIMARY KEY,
+    database TEXT NOT NULL,
+    name TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    UNIQUE (database, name));
+CREATE TABLE IF NOT EXISTS schemas (
+    id INTEGER PRIMARY KEY,
+    collection_id INTEGER NOT NULL REFERENCES collections(id),
+    number INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    first REAL,
+    last REAL,
+    sample_ids TEXT NOT NULL,
+    rows TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS schemas_collection ON schemas (collection_id);
+CREATE INDEX IF NOT EXISTS schemas_fingerprint ON schemas (fingerprint);
+CREATE TABLE IF NOT EXISTS fields (
+    path TEXT NOT NULL,
+    type TEXT NOT NULL,
+    schema_id INTEGER NOT NULL REFERENCES schemas(id),
+    PRIMARY KEY (path, type, schema_id)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS fields_schema ON fields (schema_id);
+"""
+
+_QUERY_SQL = """
+SELECT f.path, f.type, c.database, c.name, s.id, s.number, s.count,
+       s.first, s.last, s.sample_ids
+FROM fields f
+JOIN schemas s ON s.id = f.schema_id
+JOIN collections c ON c.id = s.collection_id
+WHERE {}
+ORDER BY c.database, c.name, s.number, f.path, f.type
+"""
+
+
+def fingerprint(schema) -> str:
+    """Digest of the tree of keys and types of `schema`, the same for equal
+    schemas in any process. Like the identity of schemas, it is computed
+    bottom-up and does not depend on the order of the rows.
+    """
+    table, children = schema.table, schema.children
+    digests = [None] * len(table)
+    for i in range(len(table) - 1, -1, -1):
+        kids = sorted(digests[j] for j in children[i])
+        digests[i] = _digest([table[i][1], table[i][2], kids])
+    return _digest(sorted(digests[i] for i in schema.roots))
+
+
+def _digest(value) -> str:
+    data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+class Match(object):
+    """A field found by :meth:`Catalog.query`, with the schema and
+    collection that have it.
+    """
+    __slots__ = ('path', 'type', 'database', 'collection', 'schema_id',
+                 'number', 'count', 'first', 'last', 'sample_ids')
+
+    def __init__(self, row):
+        (self.path, self.type, self.database, self.collection,
+         self.schema_id, self.number, self.count, self.first, self.last,
+         sample_ids) = row
+        self.database = self.database or None
+        self.sample_ids = json_util.loads(sample_ids)
+
+    def to_dict(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class Catalog(object):
+    """Catalog of schemas in the SQLite database file `path`, created if
+    needed. It may be shared between threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript(_SCHEMA_SQL)
+            row = self._db.execute(
+                "SELECT value FROM info WHERE key = 'version'").fetchone()
+            if row is None:
+                self._db.execute("INSERT INTO info VALUES ('version', ?)",
+                                 (str(CATALOG_VERSION),))
+            elif int(row[0]) != CATALOG_VERSION:
+                raise ValueError('Unsupported catalog version {} in "{}"'
+                                 .format(row[0], path))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_schemas(self, database, collection, schemas, nids=3):
+        """Store the schemas of a :class:`alsdata.core.SchemaSet` for
+        `collection` of `database`, with up to `nids` sample ids each,
+        replacing any that were stored for it before. The `database` of
+        schemas read from files is None.
+
+        Schemas are numbered from 0 in date order, as in the reports.
+        """
+        rows, fields = [], []
+        for number, (dtrange, s, ids) in enumerate(schemas.items_bydate()):
+            first, last = (None if d is None else d.timestamp()
+                           for d in dtrange)
+            rows.append((number, fingerprint(s), len(ids), first, last,
+                         json_util.dumps(ids.head(nids)),
+                         json.dumps(s.table, separators=(',', ':'))))
+            fields.append(set(s.paths()))
+        records = sum(r[2] for r in rows)
+        database = database or ''
+        with self._lock, self._db:
+            cur = self._db.cursor()
+            cid = self._collection_id(cur, database, collection)
+            if cid is not None:
+                cur.execute('DELETE FROM fields WHERE schema_id IN '
+                            '(SELECT id FROM schemas WHERE collection_id = ?)',
+                            (cid,))
+                cur.execute('DELETE FROM schemas WHERE collection_id = ?',
+                            (cid,))
+                cur.execute('UPDATE collections SET records = ? WHERE id = ?',
+                            (records, cid))
+            else:
+                cur.execute('INSERT INTO collections (database, name, '
+                            'records) VALUES (?, ?, ?)',
+                            (database, collection, records))
+                cid = cur.lastrowid
+            for row, paths in zip(rows, fields):
+                cur.execute('INSERT INTO schemas (collection_id, number, '
+                            'fingerprint, count, first, last, sample_ids, '
+                            'rows) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (cid,) + row)
+                sid = cur.lastrowid
+                cur.executemany('INSERT INTO fields VALUES (?, ?, ?)',
+                                [(p, t, sid) for p, t in paths])
+
+    @staticmethod
+    def _collection_id(cur, database, collection):
+        row = cur.execute('SELECT id FROM collections WHERE database = ? '
+                          'AND name = ?', (database, collection)).fetchone()
+        return row and row[0]
+
+    def query(self, path, type_=None, collection=None) -> list:
+        """Fields matching `path`, which may have wildcards, and `type_` if
+        given, in the schemas of all collections or only of `collection`.
+
+        Returns a list of :class:`Match`, by collection and schema.
+        """
+        if '*' in path or '?' in path:
+            # "[" starts a character class in GLOB; "[]" is in many paths
+            where, args = ['f.path GLOB ?'], [path.replace('[', '[[]')]
+        else:
+            where, args = ['f.path = ?'], [path]
+        if type_:
+            where.append('f.type = ?')
+            args.append(type_)
+        if collection:
+            where.append('c.name = ?')
+            args.append(collection)
+        sql = _QUERY_SQL.format(' AND '.join(where))
+        with self._lock:
+            return [Match(row) for row in self._db.execute(sql, args)]
+
+    def collections(self) -> list:
+        """(database, name, records, number of schemas) of each collection.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT c.database, c.name, c.records, COUNT(s.id) '
+                'FROM collections c LEFT JOIN schemas s '
+                'ON s.collection_id = c.id GROUP BY c.id '
+                'ORDER BY c.database, c.name').fetchall()
+        return [(row[0] or None,) + row[1:] for row in rows]
+
+    def schema(self, schema_id) -> Schema:
+        """The schema stored under `schema_id`, e.g. of a :class:`Match`.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT rows, first FROM schemas '
+                                   'WHERE id = ?', (schema_id,)).fetchone()
+        if row is None:
+            raise KeyError(schema_id)
+        return Schema.from_table(json.loads(row[0]), date=row[1])
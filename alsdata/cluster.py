@@ -0,0 +1,174 @@
+"""
+Group similar schemas into clusters.
+
+Schemas are compared by the Jaccard similarity of their sets of
+(path, type) features, see :meth:`alsdata.core.Schema.paths`. Candidate
+pairs are found with MinHash signatures and locality-sensitive hashing
+(LSH), so that not every pair of schemas has to be compared, and then
+checked against the exact similarity.
+"""
+import random
+import zlib
+
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+
+
+def features(schema) -> frozenset:
+    """The (path, type) pairs of a schema.
+    """
+    return frozenset(schema.paths())
+
+
+def jaccard(f1, f2) -> float:
+    if not f1 and not f2:
+        return 1.0
+    return len(f1 & f2) / float(len(f1 | f2))
+
+
+class MinHasher(object):
+    """Compute MinHash signatures of `num_perm` values for sets of
+    features. Hashes of each feature are computed once and cached.
+    """
+    def __init__(self, num_perm=64, seed=0):
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME))
+                       for _ in range(num_perm)]
+        self._cache = {}
+
+    def _hashes(self, feature):
+        h = self._cache.get(feature)
+        if h is None:
+            x = zlib.crc32(repr(feature).encode('utf-8')) & _MASK
+            h = self._cache[feature] = tuple((a * x + b) % _PRIME
+                                             for a, b in self._perms)
+        return h
+
+    def signature(self, feature_set) -> tuple:
+        if not feature_set:
+            return (_PRIME,) * len(self._perms)
+        return tuple(map(min, zip(*map(self._hashes, feature_set))))
+
+
+class Cluster(object):
+    """A group of similar schemas, summarized as one "union schema": the
+    number of records with each (path, type) among all of the schemas.
+    """
+    def __init__(self):
+        self.schemas = []
+        self.count = 0
+        self.dtrange = None
+        self.fields = {}  # (path, type) => number of records
+
+    def add(self, schema, count, dtrange=None, feature_set=None):
+        self.schemas.append(schema)
+        self.count += count
+        if dtrange is not None:
+            if self.dtrange is None:
+                self.dtrange = tuple(dtrange)
+            else:
+                self.dtrange = (min(self.dtrange[0], dtrange[0]),
+                                max(self.dtrange[1], dtrange[1]))
+        if feature_set is None:
+            feature_set = features(schema)
+        for f in feature_set:
+            self.fields[f] = self.fields.get(f, 0) + count
+
+    def union(self) -> list:
+        """(path, type, count) of each field, in path order.
+        """
+        return [(path, type_, n)
+                for (path, type_), n in sorted(self.fields.items())]
+
+
+class _UnionFind(object):
+    def __init__(self, n):
+        self._parent = list(range(n))
+
+    def find(self, i):
+        p = self._parent
+        while p[i] != i:
+            p[i] = p[p[i]]
+            i = p[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            self._parent[max(i, j)] = min(i, j)
+
+
+def lsh_bands(threshold, num_perm, recall=0.95) -> int:
+    """Smallest number of bands, dividing `num_perm`, for which a pair
+    of sets with similarity `threshold` becomes a candidate with
+    probability at least `recall`.
+    """
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands
+    return num_perm
+
+
+def cluster_schemas(schemas, threshold=0.8, num_perm=64, bands=None,
+                    seed=0):
+    """Group the schemas of a :class:`alsdata.core.SchemaSet` into clusters
+    of schemas whose Jaccard similarity, directly or through other
+    schemas in the cluster, is at least `threshold`.
+
+    Args:
+        schemas: SchemaSet
+        threshold: Minimum similarity, between 0 and 1
+        num_perm: Number of values in the MinHash signatures
+        bands: Number of LSH bands; must divide `num_perm`. More bands
+               find more candidates at lower similarities. By default,
+               see :func:`lsh_bands`.
+    Returns:
+        List of :class:`Cluster`, largest (by number of records) first.
+    """
+    if not 0 <= threshold <= 1:
+        raise ValueError('Similarity threshold must be between 0 and 1')
+    if bands is None:
+        bands = lsh_bands(threshold, num_perm)
+    if bands < 1 or num_perm % bands:
+        raise ValueError('Number of bands must divide number of '
+                         'permutations ({:d})'.format(num_perm))
+    items = list(schemas.items_bydate())
+    # schemas with the same features are always in the same cluster
+    groups, group_idx = [], {}
+    for i, (_, s, _) in enumerate(items):
+        f = features(s)
+        g = group_idx.get(f)
+        if g is None:
+            g = group_idx[f] = len(groups)
+            groups.append((f, []))
+        groups[g][1].append(i)
+    uf = _UnionFind(len(groups))
+    hasher, rows = MinHasher(num_perm=num_perm, seed=seed), num_perm // bands
+    buckets = {}
+    for g, (f, _) in enumerate(groups):
+        sig = hasher.signature(f)
+        for b in range(bands):
+            key = (b,) + sig[b * rows:(b + 1) * rows]
+            buckets.setdefault(key, []).append(g)
+    # check candidates against the exact similarity
+    checked = set()
+    for members in buckets.values():
+        for k in range(1, len(members)):
+            g = members[k]
+            for h in members[:k]:
+                # keep scanning: later members may join other components
+                if uf.find(h) == uf.find(g) or (h, g) in checked:
+                    continue
+                checked.add((h, g))
+                if jaccard(groups[h][0], groups[g][0]) >= threshold:
+                    uf.union(h, g)
+    clusters = {}
+    for g, (f, idx) in enumerate(groups):
+        c = clusters.setdefault(uf.find(g), Cluster())
+        for i in idx:
+            dtrange, s, ids = items[i]
+            c.add(s, len(ids), dtrange=dtrange, feature_set=f)
+    return sorted(clusters.values(), key=lambda c: -c.count)
@@ -1,12 +1,31 @@
 """
 Core functionality for alsdata
 """
+import calendar
+import collections
+import datetime
+import functools
+import gzip
+import itertools
 import logging
+import re
+import sys
 import pendulum
 import six
+from bson import json_util
+from . import ids as idstore
+from . import stats as fieldstats
+from . import timeline as schema_timeline
 
 _LOG_ROOT = 'alsdata'
 
+#: Version of the on-disk format written by :meth:`SchemaSet.save`
+SNAPSHOT_VERSION = 2
+
+#: Top-level fields that :class:`SchemaFactory` takes the date of a
+#: document from
+DATE_FIELDS = ('date', 'fs', 'lastupdate', 'time')
+
 # one-time log setup
 h = logging.StreamHandler()
 f = logging.Formatter(fmt='%(asctime)s %(name)s [%(levelname)s] %(message)s')
@@ -28,20 +47,45 @@ def get_logger(name=''):
 
 class CompareResult(object):
     """Encode a comparison result with why and the values involved.
+
+    For a full comparison, also the paths that only the first schema has
+    (`removed`) and only the second one has (`added`), as (path, types)
+    pairs, and those with different types in each (`retyped`), as
+    (path, types1, types2). Types are sorted lists of type names.
     """
     LENGTH = 1    # Length mismatch
     CONTENTS = 2  # Contents mismatch
     EQUAL = 0     # Same
 
+    __slots__ = ('reason', 'v1', 'v2', 'added', 'removed', 'retyped')
+
     def __init__(self, reason=EQUAL, v1=None, v2=None):
         self.reason, self.v1, self.v2 = reason, str(v1), str(v2)
+        self.added, self.removed, self.retyped = [], [], []
 
     def __bool__(self):
         return self.reason == self.EQUAL
 
+    def to_dict(self) -> dict:
+        return {'equal': bool(self),
+                'added': [{'path': p, 'types': t} for p, t in self.added],
+                'removed': [{'path': p, 'types': t}
+                            for p, t in self.removed],
+                'retyped': [{'path': p, 'types1': t1, 'types2': t2}
+                            for p, t1, t2 in self.retyped]}
+
 
 class Schema(object):
     """Schema inferred from an input document.
+
+    There is one instance per document, so attributes are kept in slots,
+    and keys are interned so that the tables of different schemas share
+    their strings.
+
+    Schemas are equal if their tables describe the same tree of keys and
+    types, whatever the order of the rows, see :func:`_tree_id`. The rows
+    are only sorted into the canonical order of :func:`_canonical` when
+    the :attr:`table` is first read, e.g. to render a report.
     """
     class Column(object):
         DEPTH_IDX, DEPTH = 0, 'depth'
@@ -50,79 +94,156 @@ class Schema(object):
         PARENT_IDX, PARENT = 3, 'parent'
         ID_IDX, ID = 4, 'id'  # Must be last, otherwise sort() does nothing
 
+    __slots__ = ('_table', '_done', '_arr_items', '_arr_rows', '_date',
+                 '_hash', '_roots', '_children')
+
     def __init__(self, initial_rows=None):
         if initial_rows:
             self._table = initial_rows
         else:
             self._table = []
         self._done = False
-        self._cur_arr_idx = None
-        self._cur_arr_set = SchemaSet()
-        self._date = pendulum.utcfromtimestamp(0)
+        # array items seen so far in each array that is being processed,
+        # innermost last, see check_arr_dup()
+        self._arr_items = []
+        # scalar rows seen so far, by index of their parent array
+        self._arr_rows = collections.OrderedDict()
+        self._date = 0.0
+        self._hash = None  # tree id, see _tree_id()
+        self._roots, self._children = None, None
+
+    @classmethod
+    def from_table(cls, table, date=None):
+        """Create a finished schema directly from the rows of the `table`
+        of another schema, e.g. one read back from a snapshot.
+        """
+        s = cls(initial_rows=_intern_rows(table))
+        s._table = tuple(s._table)
+        s._roots, s._children = _child_index(s._table)
+        s._date = date
+        s._arr_items, s._arr_rows = None, None
+        s._done = True
+        return s
+
+    @classmethod
+    def _shared(cls, other, date):
+        """Create a finished schema that shares the (immutable) table of the
+        finished schema `other`, but has its own date.
+        """
+        s = cls.__new__(cls)
+        s._table, s._hash, s._date = other.table, hash(other), date
+        s._roots, s._children = other._roots, other._children
+        s._arr_items, s._arr_rows = None, None
+        s._done = True
+        return s
 
     @property
-    def date(self):
+    def timestamp(self):
+        """Date of the document, as seconds since the epoch (or None).
+        """
         return self._date
 
+    @property
+    def date(self):
+        """Date of the document, as a :class:`pendulum.Pendulum` in UTC (or
+        None). The UTC offset of a date string is not kept.
+        """
+        return _datetime(self._date)
+
     @property
     def table(self):
+        """Rows of the schema, in canonical order.
+        """
         if not self._done:
             raise AttributeError('Must call done() before retrieving result')
+        if self._roots is None:
+            self._table = _canonical(self._table)
+            self._roots, self._children = _child_index(self._table)
         return self._table
 
+    @property
+    def roots(self):
+        """Indexes of the top-level rows of the table, in table order.
+        """
+        self.table  # sorts and indexes the rows on first use
+        return self._roots
+
+    @property
+    def children(self):
+        """For each row of the table, the indexes of its child rows, in
+        table order. Shared between schemas; do not modify.
+        """
+        self.table  # sorts and indexes the rows on first use
+        return self._children
+
     def add(self, depth: int, key: str, type_: str, parent: int) -> int:
         if self._done:
             raise RuntimeError('Cannot add to schema after done() is called')
         idx = len(self._table)
-        skip, row = False, (depth, key, type_, parent)
+        row = (depth, sys.intern(key), type_, parent)
         # remove duplicate scalar array entries (e.g. 'str' only once)
-        skip = ((parent >= 0 and
-                 self._table[parent][self.Column.TYPE_IDX] == 'array') and
-                (type_ not in ('dict', 'array')) and (row in self._table))
-        if not skip:
-            self._table.append(row)
+        if (parent >= 0 and type_ not in ('dict', 'array') and
+                self._table[parent][self.Column.TYPE_IDX] == 'array'):
+            seen = self._arr_rows.setdefault(parent, set())
+            if row in seen:
+                return idx
+            seen.add(row)
+        self._table.append(row)
         return idx
 
     def check_arr_dup(self, arr_idx, item_idx):
+        """Remove the rows of the dict or array item of array `arr_idx`, that
+        starts at row `item_idx`, if the array already has an item of the
+        same shape.
+        """
         item = self._table[item_idx]
 
         # If scalar, ignore; duplicate scalars were removed in `add()`.
         if item[self.Column.TYPE_IDX] not in ('dict', 'array'):
             return
 
-        #print('@@ check dup table:\n{}'.format(self._dump_table()))
-
-        # Get all child items, make into a Schema instance.
-        # Shift all references by index of first item.
-        it1 = self._table[item_idx]
-        items = [(it1[0], it1[1], it1[2], -1)]
-        for it in self._table[item_idx + 1:]:
-            items.append((it[0], it[1], it[2], it[3] - item_idx))
-
-        ssc = Schema(initial_rows=items)
-        ssc.done()
-        # print('@@ sub-schema from rows:\n{}'.format(ssc._dump_table()))
-
-        # Have we already added items to this array?
-        if self._cur_arr_idx == arr_idx:
-            # Check if Schema is unique, by adding it to the SchemaSet.
-            is_new = self._cur_arr_set.add(ssc, 0)
-            # If Schema is a duplicate, remove associated items.
-            if not is_new:
-                # print('@@ rows {:d}-{:d} are duplicates'
-                #     .format(item_idx, len(self._table) - 1))
-                del self._table[item_idx:]
-                # print('@@ new table:\n{}'.format(self._dump_table()))
-            else:
-                pass
-                # print('@@ rows {:d}-{:d} are not duplicates'
-                #       .format(item_idx, len(self._table) - 1))
-                # print('@@ new table:\n{}'.format(self._dump_table()))
-            # If we are in a new array, add this as the first item.
+        # Fingerprint of the item: its rows as-is. Every item that follows
+        # the last one kept starts at the same row, so identical items
+        # have identical fingerprints without any re-mapping of parents.
+        key = (item_idx, tuple(self._table[item_idx:]))
+
+        # Arrays created after this one, i.e. inside its items, are done.
+        stack = self._arr_items
+        while stack and stack[-1][0] > arr_idx:
+            stack.pop()
+
+        # If we are in a new array, add this as the first item.
+        if not stack or stack[-1][0] != arr_idx:
+            stack.append((arr_idx, {key}, {_tree_id(self._table, item_idx)}))
+            return
+
+        # Otherwise, compare the tree id of the item (as for the whole
+        # schema) with those of the items already kept, unless the
+        # fingerprint alone shows that it is a duplicate.
+        _, keys, shapes = stack[-1]
+        if key in keys:
+            is_new = False
         else:
-            self._cur_arr_idx = arr_idx
-            self._cur_arr_set = SchemaSet()
-            self._cur_arr_set.add(ssc, 0)
+            keys.add(key)
+            shape = _tree_id(self._table, item_idx)
+            is_new = shape not in shapes
+            if is_new:
+                shapes.add(shape)
+        # If item is a duplicate, remove associated rows.
+        if not is_new:
+            del self._table[item_idx:]
+            self._forget_arr_rows(item_idx)
+
+    def _forget_arr_rows(self, start):
+        """Forget the scalar rows seen under arrays at or after row `start`,
+        after these rows were removed from the table.
+        """
+        # Those arrays were all created, and so first seen, after `start`,
+        # which makes them the most recently inserted keys (an OrderedDict,
+        # as plain dicts are only reversible from Python 3.8).
+        arr_rows = self._arr_rows
+        while arr_rows and next(reversed(arr_rows)) >= start:
+            arr_rows.popitem()
 
     def _dump_table(self):
         lines = ['-' * 45]
@@ -136,121 +257,548 @@ class Schema(object):
 
     def done(self, date=None):
         self._date = date
-        n = len(self._table)
-        last_idx = len(self._table[0])  # row length
-        # Add an index column
-        tbl = [self._table[i] + (i,) for i in range(n)]
-        # Sort the table
-        tbl.sort()
-
-        # Remap parents to correct row, as they are shuffled after sorting
-        idx_map = [0] * n
-        # Build map from current index back to original one
-        for i in range(n):
-            idx_map[tbl[i][last_idx]] = i
-        # Use map to fix parent references.
-        # Copy result back into original table (remove index column).
-        for i in range(n):
-            row = tbl[i]
-            parent = row[self.Column.PARENT_IDX]
-            if parent >= 0:
-                r = (row[0], row[1], row[2], idx_map[parent])
-            else:
-                r = tuple(row[:-1])
-            self._table[i] = r
+        # rows are sorted when the table is first read
         self._table = tuple(self._table)
+        self._roots, self._children = None, None
+        # Array de-duplication state is not needed any more; dropping it
+        # also keeps pickled schemas (e.g. from worker processes) small.
+        self._arr_items, self._arr_rows = None, None
 
         # Now we are done
         self._done = True
 
-    def compare(self, other) -> CompareResult:
+    def paths(self) -> list:
+        """(path, type) of each row of the table, in the same order.
+
+        Paths join keys with '.' and mark the items of an array with '[]',
+        e.g. "numbers[].num" for the key "num" of dicts in array "numbers".
+        """
+        tbl, paths = self.table, []
+        for depth, key, type_, parent in tbl:
+            # parents are always less deep, so they come first
+            if parent < 0:
+                path = key
+            elif tbl[parent][self.Column.TYPE_IDX] == 'array':
+                path = paths[parent][0] + '[]'
+            else:
+                path = paths[parent][0] + '.' + key
+            paths.append((path, type_))
+        return paths
+
+    def path_types(self) -> dict:
+        """Types found at each path, see :meth:`paths`, as a dict of
+        path to a sorted list of type names.
+        """
+        types = {}
+        for path, type_ in self.paths():
+            types.setdefault(path, set()).add(type_)
+        return {path: sorted(t) for path, t in types.items()}
+
+    def compare(self, other, full=False) -> CompareResult:
+        """Compare with another schema. The result tells where the tables
+        first differ and, if `full` is True, lists all the paths that were
+        added, removed or changed type; see :func:`diff_path_types`.
+        """
         if not self._done:
             raise RuntimeError('Must call done() first')
-        t1, t2 = self._table, other.table
+        t1, t2 = self.table, other.table
+        if t1 is t2 or hash(self) == hash(other):
+            return CompareResult()
         if len(t1) != len(t2):
-            return CompareResult(CompareResult.LENGTH,
-                                 len(t1), len(t2))
-        for item1, item2 in zip(t1, t2):
-            if item1 == item2:
-                continue
-            return CompareResult(CompareResult.CONTENTS, item1, item2)
-        return CompareResult()
+            result = CompareResult(CompareResult.LENGTH, len(t1), len(t2))
+        else:
+            for item1, item2 in zip(t1, t2):
+                if item1 != item2:
+                    result = CompareResult(CompareResult.CONTENTS,
+                                           item1, item2)
+                    break
+            else:
+                return CompareResult()
+        if full:
+            diff_path_types(self.path_types(), other.path_types(), result)
+        return result
 
     def __eq__(self, other):
-        if not self._done:
-            raise RuntimeError('Must call done() first')
-        return bool(self.compare(other))
+        return hash(self) == hash(other)
+
+    def __getstate__(self):
+        # tree ids differ between processes, so do not pickle them
+        state = {k: getattr(self, k) for k in self.__slots__}
+        state['_hash'] = None
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            if k == '_table' and v is not None:
+                v = _intern_rows(v)
+            setattr(self, k, v)
 
     def __hash__(self):
         if not self._done:
             raise RuntimeError('Must call done() first')
-        return hash(self._table)
+        if self._hash is None:
+            self._hash = _tree_id(self._table)
+        return self._hash
+
+
+def _intern_rows(table):
+    """Copy of the rows of `table`, with interned keys and types.
+    """
+    rows = [(d, sys.intern(k), sys.intern(t), p) for d, k, t, p in table]
+    return tuple(rows) if isinstance(table, tuple) else rows
+
+
+def diff_path_types(types1: dict, types2: dict, result=None):
+    """Fill in the lists of added, removed and retyped paths of the
+    CompareResult `result` (a new, equal, one by default) from the
+    :meth:`Schema.path_types` of two schemas. Paths are listed in sorted
+    order. Returns `result`.
+    """
+    if result is None:
+        result = CompareResult()
+    for path in sorted(types1):
+        t2 = types2.get(path)
+        if t2 is None:
+            result.removed.append((path, types1[path]))
+        elif t2 != types1[path]:
+            result.retyped.append((path, types1[path], t2))
+    result.added = [(path, types2[path]) for path in sorted(types2)
+                    if path not in types1]
+    return result
+
+
+def _canonical(rows):
+    """Sort `rows` of a schema table into a canonical order and remap
+    their parents accordingly.
+    """
+    n = len(rows)
+    # Add an index column
+    tbl = [rows[i] + (i,) for i in range(n)]
+    # Sort the table
+    tbl.sort()
+
+    # Remap parents to correct row, as they are shuffled after sorting
+    idx_map = [0] * n
+    # Build map from current index back to original one
+    id_idx = Schema.Column.ID_IDX
+    for i in range(n):
+        idx_map[tbl[i][id_idx]] = i
+    # Use map to fix parent references (and remove index column).
+    result = []
+    for row in tbl:
+        parent = row[Schema.Column.PARENT_IDX]
+        if parent >= 0:
+            result.append((row[0], row[1], row[2], idx_map[parent]))
+        else:
+            result.append(row[:id_idx])
+    return tuple(result)
+
+
+# Ids of the trees and subtrees of all schema tables seen so far, see
+# _tree_id(); ids are only taken from the counter, which is thread-safe.
+_TREE_IDS = {}
+_next_tree_id = itertools.count().__next__
+
+
+def _tree_id(rows, start=0) -> int:
+    """Id of the tree formed by `rows[start:]`, whose parents are among
+    them, or before `start` for the top-level ones.
+
+    The id of each subtree is computed bottom-up from its key, its type
+    and the sorted ids of its children, like a Merkle hash, but interned
+    (as with :func:`sys.intern`) rather than hashed: two trees have the
+    same id if and only if they have the same rows, in whatever order.
+    This takes one pass over the rows, plus sorting the ids of the
+    children of each row. Ids are only meaningful within a process.
+    """
+    tree_ids, next_id = _TREE_IDS, _next_tree_id
+    get = tree_ids.get
+    kids = [None] * (len(rows) - start)  # ids of the children of each row
+    tops = []
+    for i in range(len(rows) - 1, start - 1, -1):
+        row = rows[i]
+        ids = kids[i - start]
+        if ids is None:
+            node = (row[1], row[2])
+        else:
+            ids.sort()
+            node = (row[1], row[2], tuple(ids))
+        nid = get(node)
+        if nid is None:
+            nid = tree_ids.setdefault(node, next_id())
+        parent = row[3] - start
+        if parent >= 0:
+            ids = kids[parent]
+            if ids is None:
+                kids[parent] = [nid]
+            else:
+                ids.append(nid)
+        else:
+            tops.append(nid)
+    tops.sort()
+    node = (None, None, tuple(tops))
+    nid = get(node)
+    if nid is None:
+        nid = tree_ids.setdefault(node, next_id())
+    return nid
+
+
+def _child_index(table):
+    """Top-level rows and the children of every row of `table`.
+    """
+    roots, children = [], [[] for _ in table]
+    for i, row in enumerate(table):
+        parent = row[Schema.Column.PARENT_IDX]
+        if parent < 0:
+            roots.append(i)
+        else:
+            children[parent].append(i)
+    return roots, children
+
+
+class _FingerprintTooLong(Exception):
+    pass
+
+
+# Type names of the values of the most common exact types; subclasses are
+# left to SchemaFactory._type_name()
+_TYPE_NAMES = {int: 'int', bool: 'int', float: 'float', str: 'str',
+               dict: 'dict', list: 'array'}
+_SCALAR_NAMES = {int: 'int', bool: 'int', float: 'float', str: 'str'}
+
+
+def _scalar_names(items) -> list:
+    """Type names of `items`, in order of first appearance, or None if
+    they are not all plain scalars.
+    """
+    names = []
+    for tp in dict.fromkeys(map(type, items)):
+        name = _SCALAR_NAMES.get(tp)
+        if name is None:
+            return None
+        if name not in names:
+            names.append(name)
+    return names
+
+
+def _scalar_fields(obj) -> list:
+    """Keys and type names of the fields of the dict `obj`, interleaved,
+    or None if they are not all plain scalars or one of them is `_id`.
+    """
+    try:
+        names = list(map(_SCALAR_NAMES.__getitem__, map(type, obj.values())))
+    except KeyError:
+        return None
+    if '_id' in obj:
+        return None
+    fields = [None] * (2 * len(names))
+    fields[::2] = obj
+    fields[1::2] = names
+    return fields
 
 
 class SchemaFactory(object):
     """Generate :class:`Schema` objects from input JSON data.
 
+    Most documents in a collection have one of only a few shapes, so the
+    factory keeps an LRU cache of the schemas of recently seen shapes,
+    keyed by :meth:`fingerprint`. Schemas for documents with a cached shape
+    share the table of the cached schema.
+
+    To make very long arrays cheaper, only the first `array_limit` items
+    of each array plus `array_extra` items picked at random from the rest
+    can be inspected. The picks depend only on the array length and
+    `seed`, so documents with the same shape still get the same schema.
+
+    If a :class:`alsdata.stats.FieldStats` is given as `stats`, every
+    processed document is also added to it.
+
     Note: only one call to process() should be running at any given
     time for a single instance.
     """
-    def __init__(self):
+    #: Default number of shapes kept in the cache
+    CACHE_SIZE = 1024
+    #: Fingerprints longer than this are not cached
+    FINGERPRINT_MAX = 10000
+
+    def __init__(self, cache_size=CACHE_SIZE, array_limit=None,
+                 array_extra=0, seed=0, stats=None):
         self._schema = None
+        self._stats = stats
+        self._cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._array_limit = array_limit
+        self._array_extra = array_extra
+        self._seed = seed
+
+    @property
+    def sampled(self):
+        """Whether only some items of long arrays are inspected.
+        """
+        return self._array_limit is not None
+
+    def _array_items(self, arr: list) -> list:
+        """Items of `arr` to inspect.
+        """
+        limit, n = self._array_limit, len(arr)
+        if limit is None or n <= limit:
+            return arr
+        items = arr[:limit]
+        rest = n - limit
+        # hash() of a tuple of ints is the same in every process
+        picks = {limit + hash((self._seed, n, j)) % rest
+                 for j in range(min(self._array_extra, rest))}
+        items.extend(arr[i] for i in sorted(picks))
+        return items
 
     def process(self, input_data: dict) -> Schema:
+        if self._stats is not None:
+            self._stats.add(input_data, self._type_name, self._array_items)
+        key = None
+        if self._cache_size > 0:
+            try:
+                key = self.fingerprint(input_data)
+            except _FingerprintTooLong:
+                pass
+            else:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    return Schema._shared(cached,
+                                          self._extract_date(input_data))
         self._schema = Schema()
         self._process_dict(-1, 0, input_data)
         self._schema.done(date=self._extract_date(input_data))
+        if key is not None:
+            self._cache[key] = self._schema
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
         return self._schema
 
+    def fingerprint(self, input_data: dict) -> tuple:
+        """Fingerprint of the shape of `input_data`, computed in a single
+        pass without building a :class:`Schema`.
+
+        The fingerprint lists keys and types in document order, with a
+        None after the contents of each container. In an array, only the
+        first scalar of each type and the first of identical dict or
+        array items are listed, as :meth:`Schema.add` and
+        :meth:`Schema.check_arr_dup` drop the others. So documents with
+        the same fingerprint have the same schema, however long their
+        arrays are.
+        """
+        fp, fp_max = [], self.FINGERPRINT_MAX
+        type_name, names = self._type_name, _TYPE_NAMES.get
+        push, end_container = self._push, self._end_container
+        # (iterator over the contents of a container; for an array, the
+        # types of the scalars and the fingerprints of the items listed so
+        # far, None for a dict; and where the fingerprint of the container
+        # starts)
+        stack = [(iter(six.iteritems(input_data)), None, None, 0)]
+        while stack:
+            it, scalars, items, _ = stack[-1]
+            if scalars is None:
+                for key, val in it:
+                    if key == '_id':
+                        continue
+                    t = names(type(val)) or type_name(val)
+                    fp.append(key)
+                    fp.append(t)
+                    if (t == 'dict' or t == 'array') and \
+                            push(fp, stack, val, t, None):
+                        break
+                else:
+                    end_container(fp, stack)
+            else:
+                for val in it:
+                    t = names(type(val)) or type_name(val)
+                    if t == 'dict' or t == 'array':
+                        fp.append(t)
+                        if push(fp, stack, val, t, items):
+                            break
+                    elif t not in scalars:
+                        scalars.add(t)
+                        fp.append(t)
+                else:
+                    end_container(fp, stack)
+            if len(fp) > fp_max:
+                raise _FingerprintTooLong()
+        return tuple(fp)
+
+    def _push(self, fp, stack, val, t, items):
+        """Add the contents of the container `val`, of type `t`, to `fp` at
+        once if they are all plain scalars; otherwise push `val` on the
+        `stack` of :meth:`fingerprint` and return True. `items` are the
+        fingerprints of the items of the array that `val` is an item of,
+        or None.
+        """
+        start = len(fp) - 1  # the type of `val` was just added
+        if t == 'dict':
+            flat = _scalar_fields(val)
+            if flat is None:
+                stack.append((iter(six.iteritems(val)), None, None, start))
+                return True
+        else:
+            arr = self._array_items(val)
+            flat = _scalar_names(arr)
+            if flat is None:
+                stack.append((iter(arr), set(), set(), start))
+                return True
+        fp.extend(flat)
+        fp.append(None)
+        if items is not None:
+            self._drop_repeated(fp, start, items)
+        return False
+
+    @classmethod
+    def _end_container(cls, fp, stack):
+        """Close the container on top of the `stack` of :meth:`fingerprint`
+        and, if it is an array item, drop it from `fp` if the array already
+        has an identical one.
+        """
+        start = stack.pop()[3]
+        if not stack:
+            return
+        fp.append(None)
+        items = stack[-1][2]
+        if items is not None:
+            cls._drop_repeated(fp, start, items)
+
+    @staticmethod
+    def _drop_repeated(fp, start, items):
+        """Drop the array item that starts at `start` from `fp` if it is in
+        `items`, the fingerprints of the items of its array so far.
+        """
+        item = tuple(fp[start:])
+        if item in items:
+            del fp[start:]
+        else:
+            items.add(item)
+
     @staticmethod
     def _extract_date(d):
-        """Extract date wherever it can be found.
+        """Extract date wherever it can be found, as seconds since the epoch.
         """
         if 'date' in d:
             value = d['date']
             if isinstance(value, str):
-                dt = pendulum.parse(value)
-            elif isinstance(value, int):
-                dt = pendulum.utcfromtimestamp(float(value))
-            elif isinstance(value, float):
-                dt = pendulum.utcfromtimestamp(value)
+                ts = parse_date(value)
+            elif isinstance(value, (int, float)):
+                ts = float(value)
             else:
-                dt = pendulum.utcfromtimestamp(0)
+                ts = 0.0
         elif 'fs' in d and 'date' in d['fs']:
-            dt = pendulum.parse(d['fs']['date'])
+            ts = parse_date(d['fs']['date'])
         elif 'lastupdate' in d:
-            dt = pendulum.utcfromtimestamp(d['lastupdate'])
+            ts = float(d['lastupdate'])
         elif 'time' in d:
-            dt = pendulum.utcfromtimestamp(d['time'])
+            ts = float(d['time'])
         else:
-            dt = pendulum.utcfromtimestamp(0)
-        return dt
+            ts = 0.0
+        return ts
 
     def _process_dict(self, n: int, depth: int, obj: dict):
         """Process contents of `obj`, at index `n` and depth `depth`.
+
+        Nested values are walked with an explicit stack, not by recursion,
+        so deeply nested documents do not hit the recursion limit.
         """
-        for key, val in six.iteritems(obj):
-            if key == '_id':
-                continue
-            t = self._type_name(val)
-            i = self._schema.add(depth, key, t, n)
-            # print('@@ {:d}->{:d}: key={} type={}'.format(n, i, key, t))
-            if t == 'array':
-                self._process_array(i, depth + 1, val)
-            elif t == 'dict':
-                self._process_dict(i, depth + 1, val)
-
-    def _process_array(self, n: int, depth: int, arr: list):
-        for val in arr:
-            t = self._type_name(val)
-            i = self._schema.add(depth, '', t, n)
-            # print('@@ {:d}->{:d}: key=NA type={}'.format(n, i, t))
-            if t in ('array', 'dict'):
-                if t == 'array':
-                    self._process_array(i, depth + 1, val)
+        schema = self._schema
+        add, check_arr_dup = schema.add, schema.check_arr_dup
+        type_name, array_items = self._type_name, self._array_items
+        # (iterator over the contents of a container, its row, the depth
+        # of its contents, the row of the array it is an item of or -1,
+        # and whether it is itself an array)
+        stack = [(iter(six.iteritems(obj)), n, depth, -1, False)]
+        while stack:
+            it, parent, d, arr, is_array = stack[-1]
+            if is_array:
+                for val in it:
+                    t = type_name(val)
+                    i = add(d, '', t, parent)
+                    if t == 'dict':
+                        stack.append((iter(six.iteritems(val)), i, d + 1,
+                                      parent, False))
+                        break
+                    if t == 'array':
+                        stack.append((iter(array_items(val)), i, d + 1,
+                                      parent, True))
+                        break
                 else:
-                    self._process_dict(i, depth + 1, val)
-                self._schema.check_arr_dup(n, i)
+                    stack.pop()
+                    if arr >= 0:
+                        check_arr_dup(arr, parent)
+            else:
+                for key, val in it:
+                    if key == '_id':
+                        continue
+                    t = type_name(val)
+                    i = add(d, key, t, parent)
+                    if t == 'dict':
+                        stack.append((iter(six.iteritems(val)), i, d + 1,
+                                      -1, False))
+                        break
+                    if t == 'array':
+                        stack.append((iter(array_items(val)), i, d + 1,
+                                      -1, True))
+                        break
+                else:
+                    stack.pop()
+                    if arr >= 0:
+                        check_arr_dup(arr, parent)
+
+    def process_events(self, events, fields=None) -> Schema:
+        """Create the schema of a document from a stream of parse `events`,
+        e.g. from :func:`alsdata.dump.bson_events`, so that the document
+        itself never has to be in memory.
+
+        Events are (key, type) pairs, one for each value in document order
+        with a key of '' for array items, where type is None if it is not
+        known. A 'dict' or 'array' value is followed by the events of its
+        contents, then by None. Array items are de-duplicated as each one
+        ends, so memory use grows with the number of distinct shapes, not
+        with the number of values. `fields`, a dict with (at least) the
+        top-level :data:`DATE_FIELDS` of the document, gives its date.
+
+        Arrays are never sampled, and statistics are not collected.
+        """
+        self._schema = schema = Schema()
+        add, check_arr_dup = schema.add, schema.check_arr_dup
+        # (row of the container, depth of its contents, whether it is an
+        # array), for each open container
+        stack = [(-1, 0, False)]
+        skip = 0
+        for ev in events:
+            if skip:
+                # inside an `_id`
+                if ev is None:
+                    skip -= 1
+                elif ev[1] == 'dict' or ev[1] == 'array':
+                    skip += 1
+                continue
+            if ev is None:
+                i = stack.pop()[0]
+                if not stack:
+                    raise ValueError('Unbalanced end of container in events')
+                parent, _, in_array = stack[-1]
+                if in_array:
+                    check_arr_dup(parent, i)
+                continue
+            key, t = ev
+            parent, depth, in_array = stack[-1]
+            if key == '_id' and not in_array:
+                if t == 'dict' or t == 'array':
+                    skip = 1
+                continue
+            if t is None:
+                raise ValueError('Cannot determine type for "{}"'.format(key))
+            i = add(depth, key, t, parent)
+            if t == 'dict' or t == 'array':
+                stack.append((i, depth + 1, t == 'array'))
+        if len(stack) != 1 or skip:
+            raise ValueError('Events end inside a container')
+        schema.done(date=self._extract_date(fields or {}))
+        return schema
 
     @staticmethod
     def _type_name(val):
@@ -270,41 +818,162 @@ class SchemaFactory(object):
 
 class SchemaSet(object):
     """A set of distinct schemas.
+
+    The ids of the documents with each schema are kept in an
+    :class:`alsdata.ids.IdStore`, according to the retention policy
+    `id_policy` (see :func:`alsdata.ids.store_factory`).
+
+    Optional per-field statistics on the same documents are kept in
+    `stats`, a :class:`alsdata.stats.FieldStats`, and histograms of their
+    dates in `timeline`, a :class:`alsdata.timeline.Timeline`.
     """
-    def __init__(self):
+    def __init__(self, id_policy=idstore.FULL):
         self.schemas = {}
         self._dtrange = [] # (max dt, min dt, schema)
         self._dtrange_idx = {}
+        self.meta = {}  # saved with, and restored from, snapshots
+        self.id_policy = id_policy
+        self._new_ids = idstore.store_factory(id_policy)
+        self._bydate = None  # sorted _dtrange, until it changes
+        self.stats = None
+        self.timeline = None
 
     def add(self, s, id_):
         is_new = False
+        if self.timeline is not None:
+            self.timeline.add(s, s.timestamp)
         try:
             self.schemas[s].append(id_)
-            dt = s.date
+            dt = s.timestamp
             i = self._dtrange_idx[s]
             dtrange = self._dtrange[i]
             if dt is None:
                 pass
             elif dt > dtrange[0]:
                 dtrange[0] = dt
+                self._bydate = None
             elif dt < dtrange[1]:
                 dtrange[1] = dt
+                self._bydate = None
         except KeyError:
             is_new = True
-            self.schemas[s] = [id_]
+            ids = self._new_ids()
+            ids.append(id_)
+            self.schemas[s] = ids
             idx = len(self._dtrange)
             # putting `idx` in tuple avoids sort comparisons on 's'
-            self._dtrange.append([s.date, s.date, idx, s])
+            self._dtrange.append([s.timestamp, s.timestamp, idx, s])
             self._dtrange_idx[s] = idx
+            self._bydate = None
         return is_new
 
+    def merge(self, other):
+        """Merge the schemas, ids, date ranges and field statistics of
+        `other` into this set.
+
+        Schemas of `other` are visited in the order in which they were
+        first added there, so merging the sets built from consecutive
+        slices of some input gives the same result as building a single
+        set from the whole input.
+        """
+        self._bydate = None
+        for dtmax, dtmin, _, s in other._dtrange:
+            ids = other.schemas[s]
+            try:
+                i = self._dtrange_idx[s]
+            except KeyError:
+                idx = len(self._dtrange)
+                self.schemas[s] = self._new_ids()
+                self.schemas[s].merge(ids)
+                self._dtrange.append([dtmax, dtmin, idx, s])
+                self._dtrange_idx[s] = idx
+                continue
+            self.schemas[s].merge(ids)
+            dtrange = self._dtrange[i]
+            if dtmax is not None and dtmax > dtrange[0]:
+                dtrange[0] = dtmax
+            if dtmin is not None and dtmin < dtrange[1]:
+                dtrange[1] = dtmin
+        if other.stats is not None:
+            if self.stats is None:
+                self.stats = fieldstats.FieldStats(p=other.stats.p)
+            self.stats.merge(other.stats)
+        if other.timeline is not None:
+            if self.timeline is None:
+                self.timeline = schema_timeline.Timeline(
+                    unit=other.timeline.unit)
+            self.timeline.merge(other.timeline)
+
+    def to_dict(self) -> dict:
+        """Snapshot of the set as a dict of JSON-able values (apart from
+        ids, which may need :mod:`bson.json_util`).
+        """
+        items = []
+        for dtmax, dtmin, _, s in self._dtrange:
+            items.append({'table': [list(row) for row in s.table],
+                          'dates': [dtmin, dtmax],
+                          'ids': idstore.store_to_dict(self.schemas[s])})
+        d = {'version': SNAPSHOT_VERSION, 'meta': self.meta,
+             'id_policy': self.id_policy, 'schemas': items}
+        if self.stats is not None:
+            d['stats'] = self.stats.to_dict()
+        if self.timeline is not None:
+            d['timeline'] = self.timeline.to_dict(
+                [item[3] for item in self._dtrange])
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        """Re-create a set from the output of :meth:`to_dict`.
+        """
+        version = d.get('version')
+        if version not in (1, SNAPSHOT_VERSION):
+            raise ValueError('Unsupported snapshot version: {}'
+                             .format(version))
+        schemas = cls(id_policy=d.get('id_policy', idstore.FULL))
+        schemas.meta = d.get('meta', {})
+        for idx, item in enumerate(d['schemas']):
+            dtmin, dtmax = item['dates']
+            s = Schema.from_table(item['table'], date=dtmin)
+            if version == 1:  # plain list of all ids
+                ids = idstore.store_from_list(item['ids'])
+            else:
+                ids = idstore.store_from_dict(item['ids'])
+            schemas.schemas[s] = ids
+            schemas._dtrange.append([dtmax, dtmin, idx, s])
+            schemas._dtrange_idx[s] = idx
+        if d.get('stats') is not None:
+            schemas.stats = fieldstats.FieldStats.from_dict(d['stats'])
+        if d.get('timeline') is not None:
+            schemas.timeline = schema_timeline.Timeline.from_dict(
+                d['timeline'], [item[3] for item in schemas._dtrange])
+        return schemas
+
+    def save(self, path: str):
+        """Write a gzip-compressed JSON snapshot of this set to `path`.
+        """
+        with gzip.open(path, 'wt') as f:
+            f.write(json_util.dumps(self.to_dict(), separators=(',', ':')))
+
+    @classmethod
+    def load(cls, path: str):
+        """Read a snapshot written by :meth:`save`.
+        """
+        with gzip.open(path, 'rt') as f:
+            return cls.from_dict(json_util.loads(f.read()))
+
     def items(self):
         return six.iteritems(self.schemas)
 
     def items_bydate(self):
-        for item in sorted(self._dtrange):
+        """Yield ((min date, max date), schema, ids) in date order, with
+        dates as :class:`pendulum.Pendulum` objects in UTC.
+        """
+        if self._bydate is None:
+            self._bydate = sorted(self._dtrange)
+        for item in self._bydate:
             s = item[3]
-            yield (item[1], item[0]), s, self.schemas[s]
+            yield (_datetime(item[1]), _datetime(item[0])), s, self.schemas[s]
 
     def __iter__(self):
         return iter(self.schemas.keys())
@@ -314,3 +983,45 @@ class SchemaSet(object):
 
     def __len__(self):
         return len(self.schemas)
+
+
+# ISO-8601 dates and date-times, e.g. "2017-08-18", "2017-08-18 10:00",
+# "2017-08-18T10:00:00.5Z" or "2017-08-18T10:00:00+02:00"
+_ISO_DATE = re.compile(r'(\d{4})-(\d\d)-(\d\d)'
+                       r'(?:[T ](\d\d):(\d\d)(?::(\d\d)(?:[.,](\d+))?)?)?'
+                       r'(Z|[+-]\d\d(?::?\d\d)?)?$')
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(value: str) -> float:
+    """Parse a date string into seconds since the epoch. Strings without a
+    time zone are taken to be in UTC. A UTC offset only shifts the result:
+    it is not kept, so dates from strings with one are reported in UTC
+    (e.g. "2017-08-18T12:00:00+02:00" as 10:00 UTC), as those loaded
+    from snapshots always were.
+
+    ISO-8601 strings are parsed directly; anything else is left to
+    :func:`pendulum.parse`. Results are cached, as the same dates tend to
+    come up again and again.
+    """
+    m = _ISO_DATE.match(value)
+    if m is None:
+        return pendulum.parse(value).timestamp()
+    y, mo, d, h, mi, sec, frac, tz = m.groups()
+    try:
+        dt = datetime.datetime(int(y), int(mo), int(d), int(h or 0),
+                               int(mi or 0), int(sec or 0))
+    except ValueError:
+        return pendulum.parse(value).timestamp()
+    ts = float(calendar.timegm(dt.timetuple()))
+    if frac:
+        ts += int(frac[:6].ljust(6, '0')) / 1e6
+    if tz and tz != 'Z':
+        sign = -1 if tz[0] == '-' else 1
+        tz = tz[1:].replace(':', '')
+        ts -= sign * (int(tz[:2]) * 3600 + int(tz[2:4] or 0) * 60)
+    return ts
+
+
+def _datetime(ts):
+    return None if ts is None else pendulum.utcfromtimestamp(ts)
@@ -0,0 +1,80 @@
+"""
+Structural differences between the schemas of a SchemaSet.
+"""
+import itertools
+import multiprocessing
+from .core import diff_path_types
+
+
+def schema_pairs(n: int, adjacent=False) -> list:
+    """Pairs (i, j), i < j, of indexes of `n` schemas to compare: all of
+    them, or if `adjacent` is True only each schema and the next one.
+    """
+    if adjacent:
+        return [(i, i + 1) for i in range(n - 1)]
+    return list(itertools.combinations(range(n), 2))
+
+
+class _Differ(object):
+    """Compare pairs of schemas, computing the types at each path of a
+    schema only once.
+    """
+    def __init__(self, schemas):
+        self._schemas = schemas
+        self._types = {}
+
+    def _path_types(self, i):
+        types = self._types.get(i)
+        if types is None:
+            types = self._types[i] = self._schemas[i].path_types()
+        return types
+
+    def __call__(self, pair):
+        i, j = pair
+        result = self._schemas[i].compare(self._schemas[j])
+        if not result:
+            diff_path_types(self._path_types(i), self._path_types(j), result)
+        return i, j, result
+
+
+_differ = None  # in worker processes
+
+
+def _init_worker(schemas):
+    global _differ
+    _differ = _Differ(schemas)
+
+
+def _diff_pair(pair):
+    return _differ(pair)
+
+
+def diff_schemas(schemas, adjacent=False, workers=0):
+    """Compare schemas, by default every pair of them.
+
+    Args:
+        schemas: List of finished schemas, e.g. in the order of
+                 :meth:`SchemaSet.items_bydate`
+        adjacent: Only compare each schema with the next one in the list
+        workers: Compare pairs in this many parallel processes
+    Yields:
+        (i, j, result) for the schemas at indexes i and j, where result is
+        the :class:`CompareResult` of a full comparison, in the order of
+        :func:`schema_pairs`.
+    """
+    pairs = schema_pairs(len(schemas), adjacent=adjacent)
+    if workers < 2 or len(pairs) < 2:
+        differ = _Differ(schemas)
+        for pair in pairs:
+            yield differ(pair)
+        return
+    chunksize = max(1, len(pairs) // (workers * 4))
+    pool = multiprocessing.Pool(processes=workers, initializer=_init_worker,
+                                initargs=(schemas,))
+    try:
+        for item in pool.imap(_diff_pair, pairs, chunksize=chunksize):
+            yield item
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,251 @@
+"""
+Read documents directly from mongodump BSON files and JSON-lines files,
+without restoring them into MongoDB first.
+"""
+import mmap
+import os
+import struct
+import bson
+from bson import json_util
+from .core import get_logger
+
+_log = get_logger('dump')
+
+_INT32 = struct.Struct('<i')
+
+#: Size of an empty document, the smallest valid one
+MIN_DOC_SIZE = 5
+#: MongoDB's document size limit, plus some slack for dump overhead
+MAX_DOC_SIZE = 16 * 1024 * 1024 + 16 * 1024
+
+
+def iter_bson(path: str, offset=0, resync=True, raw=False):
+    """Iterate over the documents in a mongodump ``.bson`` file.
+
+    The file is memory-mapped and documents are decoded one at a time,
+    so it is never loaded into memory as a whole. With `raw`, documents
+    are not decoded at all but yielded as bytes, e.g. for
+    :func:`bson_events`; then only their framing (length and final null
+    byte) is checked.
+
+    Args:
+        path: Input file
+        offset: Byte offset of the first document to read, e.g. one
+                logged for an earlier, interrupted, run.
+        resync: If True, skip over corrupt records by searching for the next
+                position that holds a valid document. Otherwise, raise
+                ValueError at the first corrupt record.
+    Yields:
+        (offset, document) pairs, where `offset` is the byte offset just
+        past the document (i.e. where reading would resume).
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if offset >= size:
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            pos = offset
+            while pos < size:
+                doc, n = _decode_at(mm, pos, size, raw)
+                if doc is not None:
+                    pos += n
+                    yield pos, doc
+                    continue
+                if not resync:
+                    raise ValueError('Corrupt record in "{}" at offset {:d}'
+                                     .format(path, pos))
+                nxt = _resync(mm, pos + 1, size, raw)
+                if nxt < size:
+                    _log.warning('Corrupt record in "{}" at offset {:d}; '
+                                 'skipped {:d} bytes'
+                                 .format(path, pos, nxt - pos))
+                else:
+                    _log.warning('Truncated or corrupt record in "{}" at '
+                                 'offset {:d}; no more documents found'
+                                 .format(path, pos))
+                pos = nxt
+        finally:
+            mm.close()
+
+
+def _decode_at(mm, pos, size, raw=False):
+    """Decode the document starting at `pos`, or with `raw` only copy it.
+
+    Returns (document, length), with a document of None if there is no
+    valid document at that position.
+    """
+    if pos + MIN_DOC_SIZE > size:
+        return None, 0
+    n = _INT32.unpack_from(mm, pos)[0]
+    if n < MIN_DOC_SIZE or n > MAX_DOC_SIZE or pos + n > size or \
+            mm[pos + n - 1] != 0:
+        return None, 0
+    if raw:
+        return mm[pos:pos + n], n
+    try:
+        return bson.BSON(mm[pos:pos + n]).decode(), n
+    except (bson.errors.InvalidBSON, ValueError, OverflowError):
+        return None, 0
+
+
+def _resync(mm, pos, size, raw=False):
+    """Find the first position at or after `pos` with a valid document.
+    """
+    while pos < size:
+        if _decode_at(mm, pos, size, raw)[0] is not None:
+            return pos
+        pos += 1
+    return size
+
+
+# Schema type names of BSON element types, as SchemaFactory gives for the
+# decoded values: booleans are ints, and code and symbols are strings
+_BSON_TYPE_NAMES = {0x01: 'float', 0x02: 'str', 0x03: 'dict', 0x04: 'array',
+                    0x08: 'int', 0x0D: 'str', 0x0E: 'str', 0x0F: 'str',
+                    0x10: 'int', 0x12: 'int'}
+# Sizes of fixed-size element values
+_BSON_FIXED_SIZES = {0x01: 8, 0x06: 0, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0,
+                     0x10: 4, 0x11: 8, 0x12: 8, 0x13: 16, 0x7F: 0, 0xFF: 0}
+
+
+def _value_end(data, t, pos):
+    """Offset just past the value of type `t` that starts at `pos`.
+    """
+    size = _BSON_FIXED_SIZES.get(t)
+    if size is not None:
+        return pos + size
+    if t in (0x02, 0x0D, 0x0E):  # string
+        return pos + 4 + _INT32.unpack_from(data, pos)[0]
+    if t in (0x03, 0x04, 0x0F):  # document, array, code with scope
+        return pos + _INT32.unpack_from(data, pos)[0]
+    if t == 0x05:  # binary
+        return pos + 5 + _INT32.unpack_from(data, pos)[0]
+    if t == 0x0C:  # DBPointer
+        return pos + 16 + _INT32.unpack_from(data, pos)[0]
+    if t == 0x0B:  # regular expression: two C strings
+        return data.index(b'\x00', data.index(b'\x00', pos) + 1) + 1
+    raise bson.errors.InvalidBSON('Unknown BSON type 0x{:02X} at offset {:d}'
+                                  .format(t, pos))
+
+
+def bson_events(data, pos=0):
+    """Walk the BSON document that starts at offset `pos` of `data` (e.g.
+    bytes or an mmap) without decoding it, and yield the parse events of
+    :meth:`alsdata.core.SchemaFactory.process_events`.
+
+    Each type of scalar in an array is given only once, as repeats add
+    nothing to a schema; so a huge array of numbers gives a single event.
+    The type of values that SchemaFactory cannot handle, e.g. an ObjectId,
+    is None. Raises :class:`bson.errors.InvalidBSON` if the document is
+    malformed.
+    """
+    names, fixed = _BSON_TYPE_NAMES, _BSON_FIXED_SIZES
+    unpack_int, find = _INT32.unpack_from, data.index
+    try:
+        # (end of a container, and for an array the scalar types seen in
+        # it, None for a document), for each open one
+        stack = [(pos + unpack_int(data, pos)[0], None)]
+        pos += 4
+        seen = None
+        while True:
+            t = data[pos]
+            if t == 0:
+                pos += 1
+                end, _ = stack.pop()
+                if pos != end:
+                    raise bson.errors.InvalidBSON(
+                        'Bad length of BSON document or array ending at '
+                        'offset {:d}'.format(pos))
+                if not stack:
+                    return
+                seen = stack[-1][1]
+                yield None
+                continue
+            k = find(b'\x00', pos + 1)
+            if t == 0x03 or t == 0x04:
+                key = '' if seen is not None else \
+                    data[pos + 1:k].decode('utf-8')
+                pos = k + 1
+                seen = set() if t == 0x04 else None
+                stack.append((pos + unpack_int(data, pos)[0], seen))
+                pos += 4
+                yield key, names[t]
+                continue
+            size = fixed.get(t)
+            start, pos = pos, k + 1
+            pos = pos + size if size is not None else _value_end(data, t, pos)
+            if seen is None:
+                yield data[start + 1:k].decode('utf-8'), names.get(t)
+            elif t not in seen:
+                seen.add(t)
+                yield '', names.get(t)
+    except (IndexError, struct.error, UnicodeDecodeError) as err:
+        raise bson.errors.InvalidBSON('Truncated BSON document: {}'
+                                      .format(err))
+
+
+def bson_fields(data, names, pos=0) -> dict:
+    """Decode only the top-level fields `names`, if present, of the BSON
+    document at offset `pos` of `data`, skipping over the others. Raises
+    :class:`bson.errors.InvalidBSON` if the document is malformed.
+    """
+    fields = {}
+    try:
+        end = pos + _INT32.unpack_from(data, pos)[0] - 1
+        pos += 4
+        while pos < end:
+            t = data[pos]
+            k = data.index(b'\x00', pos + 1)
+            key = data[pos + 1:k].decode('utf-8')
+            stop = _value_end(data, t, k + 1)
+            if key in names:
+                elt = data[pos:stop]
+                fields.update(bson.decode(
+                    _INT32.pack(len(elt) + 5) + elt + b'\x00'))
+            pos = stop
+    except (IndexError, struct.error, UnicodeDecodeError) as err:
+        raise bson.errors.InvalidBSON('Bad BSON document: {}'.format(err))
+    return fields
+
+
+def iter_json_lines(path: str, offset=0, resync=True):
+    """Iterate over the documents in a JSON-lines file, such as the output
+    of ``mongoexport``. MongoDB extended JSON (e.g. ``{"$oid": ..}``) is
+    decoded with :mod:`bson.json_util`.
+
+    Arguments and results are as for :func:`iter_bson`. If `offset` is in
+    the middle of a line, reading starts at the next line.
+    """
+    with open(path, 'rb') as f:
+        if offset > 0:
+            f.seek(offset - 1)
+            if f.read(1) != b'\n':
+                f.readline()
+        pos = f.tell()
+        for line in f:
+            start, pos = pos, pos + len(line)
+            if not line.strip():
+                continue
+            try:
+                doc = json_util.loads(line.decode('utf-8'))
+                if not isinstance(doc, dict):
+                    raise ValueError('not an object')
+            except ValueError:
+                if not resync:
+                    raise ValueError('Corrupt record in "{}" at offset {:d}'
+                                     .format(path, start))
+                _log.warning('Corrupt record in "{}" at offset {:d}; '
+                             'skipped {:d} bytes'
+                             .format(path, start, pos - start))
+                continue
+            yield pos, doc
+
+
+def iter_documents(path: str, offset=0, resync=True):
+    """Iterate over the documents in a ``.bson`` dump file, or otherwise a
+    JSON-lines file. See :func:`iter_bson` for arguments and results.
+    """
+    if path.endswith('.bson'):
+        return iter_bson(path, offset=offset, resync=resync)
+    return iter_json_lines(path, offset=offset, resync=resync)
@@ -0,0 +1,176 @@
+"""
+Synthetic documents shaped like those in the ALS collections, for
+benchmarks and tests that run without a database.
+
+A generator first builds a fixed number of document "shapes": templates
+that give the keys and types of every field. The first shape is random;
+the others are variations of it, with fields added, removed or retyped,
+as happens in a collection over time. Documents then pick a shape, most
+often one of the first few, and fill it with random values.
+
+Everything depends only on the `seed`, so the same arguments always give
+the same documents.
+"""
+import random
+
+SCALARS = ('int', 'float', 'str')
+
+_WORDS = ('dataset', 'stage', 'file', 'path', 'sample', 'scan', 'energy',
+          'exposure', 'detector', 'beamline', 'angle', 'frames', 'user',
+          'size', 'quota', 'usage', 'status', 'proposal', 'owner', 'temp')
+
+#: Time of the first document, in seconds since the epoch (2014-11-16)
+START_TIME = 1416160000
+
+
+class DocumentGenerator(object):
+    """Seeded generator of synthetic documents.
+
+    Args:
+        seed: Seed of the random numbers
+        depth: Levels of nesting in each document (1 is flat)
+        width: Number of fields in each dict
+        array_len: Average number of items in each array
+        shapes: Number of distinct shapes (schemas) of documents
+        nested_arrays: Whether documents have arrays of dicts, as well
+                       as dicts and arrays of scalars
+        step: Seconds between the `time` of consecutive documents
+    """
+    def __init__(self, seed=0, depth=3, width=8, array_len=5, shapes=10,
+                 nested_arrays=True, step=60):
+        if depth < 1 or width < 1 or array_len < 1 or shapes < 1:
+            raise ValueError('Depth, width, array length and number of '
+                             'shapes must be at least 1')
+        self.depth = depth
+        self.width = width
+        self.array_len = array_len
+        self.nested_arrays = nested_arrays
+        self.step = step
+        self._rng = random.Random(seed)
+        self.shapes = self._make_shapes(shapes)
+        # Zipf-like: shape k is picked about 1 / (k + 1) as often as the
+        # first, so a few shapes account for most documents
+        self._weights = [1.0 / (k + 1) for k in range(shapes)]
+
+    def documents(self, n: int, start=0):
+        """Generate `n` documents, with `_id` and `time` numbered from
+        document `start` on.
+        """
+        rng, idx = self._rng, range(len(self.shapes))
+        picks = rng.choices(idx, weights=self._weights, k=n)
+        for i, k in enumerate(picks, start):
+            doc = {'_id': i, 'time': START_TIME + i * self.step}
+            doc.update(self._fill(self.shapes[k]))
+            yield doc
+
+    def _make_shapes(self, n):
+        base = self._template(self.depth)
+        shapes, seen = [base], {_frozen(base)}
+        tries = 0
+        while len(shapes) < n:
+            tries += 1
+            if tries > 100 * n:
+                raise ValueError('Cannot make {:d} distinct shapes; try a '
+                                 'larger width or depth'.format(n))
+            shape = _copy(base)
+            for _ in range(self._rng.randint(1, 3)):
+                self._mutate(shape)
+            key = _frozen(shape)
+            if key not in seen:
+                seen.add(key)
+                shapes.append(shape)
+        return shapes
+
+    def _template(self, depth):
+        """Random template of a dict: {key: spec}, where a spec is the name
+        of a scalar type, ('dict', template), or ('array', spec).
+        """
+        rng, tpl = self._rng, {}
+        # one field in eight is a container, if there is room: arrays of
+        # dicts multiply the size of a document at each level
+        ncont = max(1, self.width // 8) if depth > 1 else 0
+        keys = self._keys(self.width)
+        for j, key in enumerate(keys):
+            if j < ncont:
+                tpl[key] = self._container(depth - 1)
+            elif rng.random() < 0.2:
+                tpl[key] = ('array', rng.choice(SCALARS))
+            else:
+                tpl[key] = rng.choice(SCALARS)
+        return tpl
+
+    def _container(self, depth):
+        if self.nested_arrays and self._rng.random() < 0.5:
+            return ('array', ('dict', self._template(depth)))
+        return ('dict', self._template(depth))
+
+    def _keys(self, n):
+        words = self._rng.sample(_WORDS, min(n, len(_WORDS)))
+        words.extend('p{:02d}'.format(j) for j in range(n - len(words)))
+        return words
+
+    def _mutate(self, tpl):
+        """Add, remove or retype one field, somewhere in `tpl`.
+        """
+        rng = self._rng
+        # walk down to a random dict
+        while True:
+            subs = [spec for spec in tpl.values() if isinstance(spec, tuple)
+                    and _inner_dict(spec) is not None]
+            if not subs or rng.random() < 0.5:
+                break
+            tpl = _inner_dict(rng.choice(subs))
+        op = rng.randrange(3)
+        if op == 0 or len(tpl) < 2:
+            key = 'x{:02d}'.format(rng.randrange(100))
+            if key not in tpl:
+                tpl[key] = rng.choice(SCALARS)
+        elif op == 1:
+            del tpl[rng.choice(sorted(tpl))]
+        else:
+            key = rng.choice(sorted(tpl))
+            if not isinstance(tpl[key], tuple):
+                tpl[key] = rng.choice([t for t in SCALARS if t != tpl[key]])
+
+    def _fill(self, spec):
+        rng = self._rng
+        if isinstance(spec, dict):
+            return {key: self._fill(sub) for key, sub in spec.items()}
+        if isinstance(spec, tuple):
+            if spec[0] == 'dict':
+                return self._fill(spec[1])
+            n = rng.randint(1, 2 * self.array_len - 1)
+            return [self._fill(spec[1]) for _ in range(n)]
+        if spec == 'int':
+            return rng.randrange(1 << 20)
+        if spec == 'float':
+            return rng.random() * 100
+        return '{}_{:06d}'.format(rng.choice(_WORDS), rng.randrange(10 ** 6))
+
+
+def _inner_dict(spec):
+    """Template of the dict in `spec`, directly or as array items.
+    """
+    while isinstance(spec, tuple):
+        if spec[0] == 'dict':
+            return spec[1]
+        spec = spec[1]
+    return None
+
+
+def _copy(spec):
+    if isinstance(spec, dict):
+        return {key: _copy(sub) for key, sub in spec.items()}
+    if isinstance(spec, tuple):
+        return (spec[0], _copy(spec[1]))
+    return spec
+
+
+def _frozen(spec):
+    """Hashable form of a template, the same for any order of keys.
+    """
+    if isinstance(spec, dict):
+        return tuple(sorted((key, _frozen(sub)) for key, sub in spec.items()))
+    if isinstance(spec, tuple):
+        return (spec[0], _frozen(spec[1]))
+    return spec
@@ -0,0 +1,336 @@
+"""
+Storage for the ids of the documents that share a schema.
+
+How many of the ids are kept is set by a retention policy, given as a
+string to :func:`store_factory`:
+
+  - ``full``: all ids, in a compact array for integer ids and ObjectIds
+  - ``ends:K``: the first and last K ids
+  - ``sample:K``: a uniform random sample (reservoir) of K ids
+  - ``count``: no ids, only their number
+
+Whatever the policy, ``len(store)`` is the number of ids added.
+"""
+import abc
+import array
+import collections
+import functools
+import random
+import six
+from bson import Binary, ObjectId
+
+FULL, ENDS, SAMPLE, COUNT = 'full', 'ends', 'sample', 'count'
+POLICIES = (FULL, ENDS, SAMPLE, COUNT)
+
+_OID_LEN = 12
+
+
+@six.add_metaclass(abc.ABCMeta)
+class IdStore(object):
+    """Ids of documents, as kept by one retention policy.
+
+    This is an abstract superclass.
+    """
+    policy = None
+
+    def __init__(self):
+        self._count = 0
+
+    @abc.abstractmethod
+    def append(self, id_):
+        pass
+
+    @abc.abstractmethod
+    def merge(self, other):
+        """Add the ids of `other`, another store, after those in this one.
+        """
+        pass
+
+    def head(self, n):
+        """First `n` of the kept ids, as a list.
+        """
+        return self.retained()[:n]
+
+    def tail(self, n):
+        """Last `n` of the kept ids, as a list.
+        """
+        return self.retained()[-n:] if n > 0 else []
+
+    @abc.abstractmethod
+    def retained(self):
+        """All kept ids, as a list.
+        """
+        pass
+
+    def to_dict(self) -> dict:
+        return {'count': self._count, 'ids': self.retained()}
+
+    def _load(self, d: dict):
+        self._count = d['count']
+        return self
+
+    def __iter__(self):
+        return iter(self.retained())
+
+    def __len__(self):
+        return self._count
+
+    def __eq__(self, other):
+        if isinstance(other, IdStore):
+            other = other.retained()
+        return self.retained() == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{}({:d} ids)'.format(self.__class__.__name__, self._count)
+
+
+class FullIds(IdStore):
+    """All ids. Integer ids are kept in an ``array`` and ObjectIds as
+    12-byte strings in a ``bytearray``; anything else, or a mix of types,
+    falls back to a list.
+    """
+    policy = FULL
+    INT, OID, OBJ = 'int', 'oid', 'obj'
+
+    def __init__(self):
+        super(FullIds, self).__init__()
+        self._kind = None
+        self._data = None
+
+    def append(self, id_):
+        kind = self._kind
+        if kind == self.INT and type(id_) is int:
+            try:
+                self._data.append(id_)
+            except OverflowError:
+                self._to_list()
+                self._data.append(id_)
+        elif kind == self.OID and type(id_) is ObjectId:
+            self._data += id_.binary
+        elif kind is None:
+            if type(id_) is int:
+                self._kind, self._data = self.INT, array.array('q')
+            elif type(id_) is ObjectId:
+                self._kind, self._data = self.OID, bytearray()
+            else:
+                self._kind, self._data = self.OBJ, []
+            self._count -= 1
+            self.append(id_)
+        else:
+            self._to_list()
+            self._data.append(id_)
+        self._count += 1
+
+    def _to_list(self):
+        if self._kind != self.OBJ:
+            self._data = self.retained()
+            self._kind = self.OBJ
+
+    def merge(self, other):
+        if not isinstance(other, FullIds):
+            raise ValueError('Cannot merge ids kept with policy "{}" into '
+                             'all ids'.format(other.policy))
+        if other._kind is None:
+            return
+        if self._kind is None:
+            self._kind, self._data = other._kind, other._data[:]
+            self._count = other._count
+        elif self._kind == other._kind:
+            self._data.extend(other._data)
+            self._count += other._count
+        else:
+            for id_ in other.retained():
+                self.append(id_)
+
+    def _slice(self, start, stop):
+        if self._kind == self.OID:
+            b = self._data[start * _OID_LEN:stop * _OID_LEN]
+            return [ObjectId(bytes(b[i:i + _OID_LEN]))
+                    for i in range(0, len(b), _OID_LEN)]
+        return list(self._data[start:stop])
+
+    def head(self, n):
+        return self._slice(0, n) if self._kind else []
+
+    def tail(self, n):
+        if not self._kind or n <= 0:
+            return []
+        return self._slice(max(0, self._count - n), self._count)
+
+    def retained(self):
+        return self._slice(0, self._count) if self._kind else []
+
+    def to_dict(self):
+        if self._kind == self.OID:
+            ids = Binary(bytes(self._data))
+        else:
+            ids = self.retained()
+        return {'count': self._count, 'kind': self._kind, 'ids': ids}
+
+    def _load(self, d):
+        kind, ids = d.get('kind'), d['ids']
+        if kind == self.OID:
+            self._kind, self._data = kind, bytearray(ids)
+            self._count = len(self._data) // _OID_LEN
+        else:
+            for id_ in ids:
+                self.append(id_)
+        return self
+
+
+class EndIds(IdStore):
+    """The first and last `k` ids.
+    """
+    policy = ENDS
+
+    def __init__(self, k=2):
+        super(EndIds, self).__init__()
+        self._k = k
+        self._first = []
+        self._last = collections.deque(maxlen=k)
+
+    def append(self, id_):
+        if len(self._first) < self._k:
+            self._first.append(id_)
+        self._last.append(id_)
+        self._count += 1
+
+    def merge(self, other):
+        k = self._k
+        if len(self._first) < k:
+            self._first.extend(other.head(k - len(self._first)))
+        self._last.extend(other.tail(k))
+        self._count += len(other)
+
+    def head(self, n):
+        return self._first[:n]
+
+    def tail(self, n):
+        return list(self._last)[-n:] if n > 0 else []
+
+    def retained(self):
+        # the first and last ids overlap for fewer than 2k ids
+        n_last = min(self._k, max(0, self._count - len(self._first)))
+        return self._first + self.tail(n_last)
+
+    def to_dict(self):
+        return {'count': self._count, 'first': self._first,
+                'last': list(self._last)}
+
+    def _load(self, d):
+        self._count = d['count']
+        self._first = list(d['first'])
+        self._last.extend(d['last'])
+        return self
+
+
+class SampleIds(IdStore):
+    """A uniform random sample of `k` ids ("reservoir sampling").
+    """
+    policy = SAMPLE
+
+    def __init__(self, k=10, rng=None):
+        super(SampleIds, self).__init__()
+        self._k = k
+        self._rng = rng  # None for the `random` module
+        self._sample = []
+
+    def append(self, id_):
+        self._count += 1
+        if len(self._sample) < self._k:
+            self._sample.append(id_)
+        else:
+            i = (self._rng or random).randrange(self._count)
+            if i < self._k:
+                self._sample[i] = id_
+
+    def merge(self, other):
+        # Draw from either sample in proportion to the number of ids
+        # each of them stands for.
+        rng = self._rng or random
+        pools = [(self._count, list(self._sample)),
+                 (len(other), list(other.retained()))]
+        result = []
+        while len(result) < self._k and (pools[0][1] or pools[1][1]):
+            (n0, s0), (n1, s1) = pools
+            w0 = n0 if s0 else 0
+            w1 = n1 if s1 else 0
+            src = 0 if rng.random() * (w0 + w1) < w0 else 1
+            n, s = pools[src]
+            result.append(s.pop(rng.randrange(len(s))))
+            pools[src] = (n - 1, s)
+        self._sample = result
+        self._count += len(other)
+
+    def retained(self):
+        return list(self._sample)
+
+    def _load(self, d):
+        self._count = d['count']
+        self._sample = list(d['ids'])
+        return self
+
+
+class CountIds(IdStore):
+    """No ids, only their number.
+    """
+    policy = COUNT
+
+    def append(self, id_):
+        self._count += 1
+
+    def merge(self, other):
+        self._count += len(other)
+
+    def retained(self):
+        return []
+
+
+def store_factory(spec=FULL, rng=None):
+    """Parse a retention policy, e.g. "ends:2", and return a function that
+    creates empty stores for it.
+    """
+    policy, _, k = spec.partition(':')
+    if policy not in POLICIES:
+        raise ValueError('Unknown id retention policy "{}", expected one '
+                         'of: {}'.format(policy, ', '.join(POLICIES)))
+    if policy in (ENDS, SAMPLE):
+        try:
+            k = int(k) if k else (2 if policy == ENDS else 10)
+        except ValueError:
+            raise ValueError('Bad number of ids in policy "{}"'.format(spec))
+        if k < 1:
+            raise ValueError('Bad number of ids in policy "{}"'.format(spec))
+        if policy == ENDS:
+            return functools.partial(EndIds, k)
+        return functools.partial(SampleIds, k, rng=rng)
+    elif k:
+        raise ValueError('Policy "{}" does not take a number of ids'
+                         .format(policy))
+    return FullIds if policy == FULL else CountIds
+
+
+def store_to_dict(store: IdStore) -> dict:
+    d = store.to_dict()
+    d['policy'] = store.policy
+    if store.policy in (ENDS, SAMPLE):
+        d['k'] = store._k
+    return d
+
+
+def store_from_dict(d: dict, rng=None) -> IdStore:
+    policy = d['policy']
+    if policy in (ENDS, SAMPLE):
+        policy = '{}:{:d}'.format(policy, d['k'])
+    return store_factory(policy, rng=rng)()._load(d)
+
+
+def store_from_list(ids, factory=FullIds) -> IdStore:
+    store = factory()
+    for id_ in ids:
+        store.append(id_)
+    return store
+
@@ -0,0 +1,239 @@
+"""
+Runtime metrics for schema extraction, emitted as JSON lines, and optional
+profiling of the extraction loop.
+
+A :class:`MetricsSink` says where records go: to a file, one JSON object
+per line, or to the ``alsdata.metrics`` logger. Each scan of a collection
+or file gets its own :class:`ScanMetrics`, which counts documents and
+bytes, adds up the time spent in each stage, and follows the growth of
+the number of distinct schemas. It emits a "progress" record every
+`interval` seconds and a "done" record at the end.
+
+Sinks only hold their settings until the first record is written, so
+they can be passed to worker processes.
+"""
+import cProfile
+import collections
+import json
+import os
+import re
+import sys
+import threading
+import time
+from .core import get_logger
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+_log = get_logger('metrics')
+
+#: Stages of a scan, in the order of the pipeline
+STAGES = ('fetch', 'process', 'add', 'report')
+
+#: Profilers for :func:`profiled`
+PROFILERS = ('cprofile', 'sample')
+
+
+def peak_rss():
+    """Peak resident set size of this process, in bytes, or None if it is
+    not known.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class MetricsSink(object):
+    """Destination of metrics records: the file `path`, or the
+    ``alsdata.metrics`` logger (at INFO level) if `path` is None.
+    Progress records are emitted every `interval` seconds.
+    """
+    def __init__(self, path=None, interval=10.0):
+        if interval <= 0:
+            raise ValueError('Metrics interval must be positive')
+        self.path = path
+        self.interval = interval
+        self._f = None
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict):
+        line = json.dumps(record, sort_keys=True, default=str)
+        if self.path is None:
+            _log.info(line)
+            return
+        with self._lock:
+            if self._f is None:
+                self._f = open(self.path, 'a')
+            self._f.write(line + '\n')
+            self._f.flush()
+
+    def scan(self, name: str):
+        """New :class:`ScanMetrics` for the scan of `name`, emitting here.
+        """
+        return ScanMetrics(name, self)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'interval': self.interval}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+
+class ScanMetrics(object):
+    """Metrics of one scan, started when it is created. Updated by the
+    scan loop, see :meth:`update`.
+
+    Attributes:
+        docs: Number of documents scanned
+        nbytes: Number of bytes read, or None if not known
+        times: Seconds spent in each of the :data:`STAGES`
+        growth: (documents, schemas) at each new schema
+    """
+    def __init__(self, name, sink):
+        self.name = name
+        self.sink = sink
+        self.docs = 0
+        self.nbytes = None
+        self.times = dict.fromkeys(STAGES, 0.0)
+        self.growth = []
+        self._t0 = self._last = time.time()
+        self._nschemas = 0
+
+    def add_time(self, stage, seconds):
+        self.times[stage] += seconds
+
+    def add_bytes(self, n):
+        self.nbytes = n if self.nbytes is None else self.nbytes + n
+
+    def new_schema(self, docs, nschemas):
+        """Note that document number `docs` had the `nschemas`-th schema.
+        """
+        self.growth.append((docs, nschemas))
+        self._nschemas = nschemas
+
+    def update(self, docs, fetch=0.0, process=0.0, add=0.0):
+        """Set the number of documents scanned so far, and add the time
+        spent since the last update in each stage. Emits a progress record
+        if it is time to.
+        """
+        self.docs = docs
+        t = self.times
+        t['fetch'] += fetch
+        t['process'] += process
+        t['add'] += add
+        now = time.time()
+        if now - self._last >= self.sink.interval:
+            self._last = now
+            self.sink.emit(self.record('progress', now))
+
+    def record(self, event, now=None) -> dict:
+        now = time.time() if now is None else now
+        elapsed = now - self._t0
+        return {'event': event, 'name': self.name, 'pid': os.getpid(),
+                'time': now, 'elapsed': elapsed, 'docs': self.docs,
+                'docs_per_sec': self.docs / elapsed if elapsed > 0 else 0.0,
+                'bytes': self.nbytes, 'schemas': self._nschemas,
+                'times': dict(self.times), 'peak_rss': peak_rss()}
+
+    def finish(self):
+        """Emit the final record, with the schema growth curve.
+        """
+        rec = self.record('done')
+        rec['growth'] = self.growth
+        self.sink.emit(rec)
+        return rec
+
+
+class SamplingProfiler(object):
+    """Statistical profiler: a background thread takes the stack of the
+    thread that started it every `interval` seconds. Much cheaper than
+    cProfile for hot loops, at the cost of precision.
+
+    Results are written by :meth:`dump` as "folded" stacks, one line per
+    distinct stack with the number of samples, as read by flame graph
+    tools.
+    """
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._ident = None
+
+    def enable(self):
+        self._ident = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{}:{}'.format(
+                    os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, n in self.samples.most_common():
+                f.write('{} {:d}\n'.format(stack, n))
+
+
+class profiled(object):
+    """Context manager that profiles its body with the profiler named
+    `profiler` (see :data:`PROFILERS`) and writes the results to `path`:
+    ``pstats`` data for cProfile, folded stacks for sampling. Does nothing
+    if `path` is None.
+    """
+    def __init__(self, path, profiler='cprofile'):
+        if profiler not in PROFILERS:
+            raise ValueError('Unknown profiler "{}", expected one of: {}'
+                             .format(profiler, ', '.join(PROFILERS)))
+        self.path = path
+        self._prof = None
+        if path is not None:
+            self._prof = (cProfile.Profile() if profiler == 'cprofile'
+                          else SamplingProfiler())
+
+    def __enter__(self):
+        if self._prof is not None:
+            self._prof.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self._prof is not None:
+            self._prof.disable()
+            if isinstance(self._prof, cProfile.Profile):
+                self._prof.dump_stats(self.path)
+            else:
+                self._prof.dump(self.path)
+            _log.info('Wrote profile to "{}"'.format(self.path))
+        return False
+
+
+def profile_path(prefix, name, profiler='cprofile'):
+    """Profile output file for the scan of `name`, or None if `prefix` is.
+    """
+    if prefix is None:
+        return None
+    ext = '.prof' if profiler == 'cprofile' else '.folded'
+    return '{}-{}{}'.format(prefix, re.sub(r'[^\w.-]+', '_', name), ext)
@@ -0,0 +1,126 @@
+"""
+Pipelined reading of documents: fetch and decode them in background
+threads, so that schema inference does not wait for the network.
+"""
+import threading
+import time
+import bson
+from six.moves import queue
+
+_DONE = object()  # end-of-input marker
+
+
+class _Failure(object):
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class PrefetchReader(object):
+    """Iterate over the items of `source`, which are fetched ahead of time,
+    `batch_size` items at a time, by a background thread.
+
+    Up to `prefetch` batches are kept waiting in a queue. If `decode` is
+    given, each fetched item is passed through it in a second thread,
+    e.g. :func:`decode_raw` to decode ``RawBSONDocument`` instances.
+
+    Time spent in each stage is accumulated in :attr:`timings`, in
+    seconds: ``fetch`` and ``decode`` for the background threads, and
+    ``wait`` for the time the consumer was kept waiting for a batch.
+    """
+    def __init__(self, source, batch_size=1000, prefetch=4, decode=None):
+        if batch_size < 1 or prefetch < 1:
+            raise ValueError('batch_size and prefetch must be positive')
+        self._src = source
+        self._batch_size = batch_size
+        self._prefetch = prefetch
+        self._decode = decode
+        self._stop = None
+        self.timings = {'fetch': 0.0, 'decode': 0.0, 'wait': 0.0}
+        self.batches = 0
+
+    def __iter__(self):
+        self._stop = threading.Event()
+        fetched = queue.Queue(maxsize=self._prefetch)
+        threads = [threading.Thread(target=self._fetch, args=(fetched,))]
+        if self._decode is None:
+            out = fetched
+        else:
+            out = queue.Queue(maxsize=self._prefetch)
+            threads.append(threading.Thread(target=self._decode_all,
+                                            args=(fetched, out)))
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            while True:
+                t0 = time.time()
+                batch = out.get()
+                self.timings['wait'] += time.time() - t0
+                if batch is _DONE:
+                    break
+                if isinstance(batch, _Failure):
+                    raise batch.exc
+                self.batches += 1
+                for item in batch:
+                    yield item
+        finally:
+            # also stops the threads if the consumer gave up early
+            self._stop.set()
+            for t in threads:
+                t.join()
+
+    def _put(self, q, item):
+        """Put `item` on `q` unless asked to stop. Returns False if stopped.
+        """
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self, q):
+        it, n = iter(self._src), self._batch_size
+        try:
+            while not self._stop.is_set():
+                t0 = time.time()
+                batch = []
+                for item in it:
+                    batch.append(item)
+                    if len(batch) == n:
+                        break
+                self.timings['fetch'] += time.time() - t0
+                if batch and not self._put(q, batch):
+                    return
+                if len(batch) < n:
+                    break
+            self._put(q, _DONE)
+        except Exception as err:
+            self._put(q, _Failure(err))
+
+    def _decode_all(self, q_in, q_out):
+        decode = self._decode
+        while not self._stop.is_set():
+            try:
+                batch = q_in.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if batch is _DONE or isinstance(batch, _Failure):
+                self._put(q_out, batch)
+                return
+            t0 = time.time()
+            try:
+                batch = [decode(item) for item in batch]
+            except Exception as err:
+                self._put(q_out, _Failure(err))
+                return
+            self.timings['decode'] += time.time() - t0
+            if not self._put(q_out, batch):
+                return
+
+
+def decode_raw(doc):
+    """Decode a ``bson.raw_bson.RawBSONDocument`` into a dict.
+    """
+    return bson.BSON(doc.raw).decode()
@@ -2,6 +2,10 @@
 Report output formatting.
 """
 import abc
+import json
+import threading
+from concurrent import futures
+import six
 from .core import Schema
 
 I_P = Schema.Column.PARENT_IDX
@@ -13,6 +17,9 @@ I_D = Schema.Column.DEPTH_IDX
 class Reify(object):
     """Make a schema concrete by writing it to output.
 
+    Output is collected in memory and written to the stream with a single
+    call, in :meth:`done`.
+
     This is an abstract superclass.
     """
     __meta__ = abc.ABCMeta
@@ -23,45 +30,55 @@ class Reify(object):
         self._c = []
         self._ostrm = output_stream
         self._offset = 0
+        self._buf = []
 
-    def row(self, key, type_, depth):
+    def row(self, key, type_, depth, note=None):
+        """Write a row. `note` is an optional dict of field statistics,
+        see :meth:`alsdata.stats.FieldStats.summary`.
+        """
         container = None
         while depth < self._depth:
             self.pop()
         if type_ in ('array', 'dict'):
-            self.push(key, type_)
+            self.push(key, type_, note)
             container = type_
         else:
-            self.item(key, type_)
+            self.item(key, type_, note)
         return container
 
     def done(self):
         while self._c:
             self.pop()
+        self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._ostrm.write(''.join(self._buf))
+            self._buf = []
 
     def pop(self):
         type_ = self._c.pop()
         self._depth -= 1
         self.end_container(type_)
 
-    def push(self, key, type_):
-        self.begin_container(key, type_)
+    def push(self, key, type_, note=None):
+        self.begin_container(key, type_, note)
         self._c.append(type_)
         self._depth += 1
 
     def write(self, s):
-        self._ostrm.write(s)
+        self._buf.append(s)
 
     def iwrite(self, s):
-        indent = (self._depth + self._offset) * '  '
-        self._ostrm.write(indent + s)
+        self._buf.append((self._depth + self._offset) * '  ')
+        self._buf.append(s)
 
     @abc.abstractmethod
-    def item(self, key, type_):
+    def item(self, key, type_, note=None):
         pass
 
     @abc.abstractmethod
-    def begin_container(self, key, type_):
+    def begin_container(self, key, type_, note=None):
         pass
 
     @abc.abstractmethod
@@ -87,7 +104,7 @@ class JsonSchemaify(Reify):
             self.write('\n')
         self._in_list = False
 
-    def begin_container(self, key, type_):
+    def begin_container(self, key, type_, note=None):
         self.section_start()
         if key:
             self.iwrite('"{}": {{\n'.format(key))
@@ -96,9 +113,13 @@ class JsonSchemaify(Reify):
         self._offset += 1
         if type_ == 'dict':
             self.iwrite('"type": "object",\n')
+            if note:
+                self.iwrite('"x-stats": {},\n'.format(_json_note(note)))
             self.iwrite('"properties": {\n')
         else:
             self.iwrite('"type": "array",\n')
+            if note:
+                self.iwrite('"x-stats": {},\n'.format(_json_note(note)))
             self.iwrite('"items": ')  # note, choose [ ] or { } later
         self._offset += 1
         self._in_list = False
@@ -119,32 +140,35 @@ class JsonSchemaify(Reify):
             self._offset -= 1
             self.iwrite('}\n')
 
-    def item(self, key, type_):
+    def item(self, key, type_, note=None):
         if self._in_list:
             self.write(',\n')
+        extra = ', "x-stats": ' + _json_note(note) if note else ''
         if key:
-            self.iwrite('"{}": {{ "type": "{}"}}'.format(key, type_))
+            self.iwrite('"{}": {{ "type": "{}"{}}}'.format(key, type_, extra))
         else:
             if self._solo:
-                self.iwrite('"type": "{}"'.format(type_))
+                self.iwrite('"type": "{}"{}'.format(type_, extra))
             else:
-                self.iwrite('{{"type": "{}"}}'.format(type_))
+                self.iwrite('{{"type": "{}"{}}}'.format(type_, extra))
         self._in_list = True
 
 
 class Textify(Reify):
-    def item(self, key, type_):
+    def item(self, key, type_, note=None):
+        extra = _text_note(note) if note else ''
         if key:
-            self.iwrite('- {}: {}\n'.format(key, type_))
+            self.iwrite('- {}: {}{}\n'.format(key, type_, extra))
         else:
-            self.iwrite('- {}\n'.format(type_))
+            self.iwrite('- {}{}\n'.format(type_, extra))
 
-    def begin_container(self, key, type_):
+    def begin_container(self, key, type_, note=None):
         symbol = ('{}', '[]')[type_ == 'array']
+        extra = _text_note(note) if note else ''
         if key:
-            self.iwrite('- {}{}\n'.format(key, symbol))
+            self.iwrite('- {}{}{}\n'.format(key, symbol, extra))
         else:
-            self.iwrite('- {}\n'.format(symbol))
+            self.iwrite('- {}{}\n'.format(symbol, extra))
         self._offset += 1
 
     @abc.abstractmethod
@@ -152,12 +176,35 @@ class Textify(Reify):
         self._offset -= 1
 
 
+def _text_note(note):
+    types = ' '.join('{}:{:d}'.format(t, n)
+                     for t, n in sorted(note['types'].items()))
+    text = '  [{:d} records ({:.1%}); {}'.format(note['count'],
+                                                  note['fraction'], types)
+    if 'distinct' in note:
+        text += '; ~{:d} distinct'.format(note['distinct'])
+    return text + ']'
+
+
+def _json_note(note):
+    note = dict(note, fraction=round(note['fraction'], 4))
+    return json.dumps(note, sort_keys=True)
+
+
 class Report(object):
+    """Write reports on schemas.
+
+    If `stats` is a :class:`alsdata.stats.FieldStats`, each field is
+    annotated with its statistics.
+    """
     __meta__ = abc.ABCMeta
 
-    def __init__(self, ofile, *ignore):
+    def __init__(self, ofile, *ignore, stats=None):
         self._o = ofile
         self.rf = None
+        self._children = None
+        self._notes = None
+        self.stats = stats
 
     def set_output_file(self, o):
         if self._o:
@@ -168,17 +215,38 @@ class Report(object):
     def write_schema(self, schema):
         pass
 
+    def render(self, schema) -> str:
+        """Write the report for `schema` to a string instead of the output.
+        """
+        strm, self._o = self._o, six.StringIO()
+        try:
+            self.write_schema(schema)
+            return self._o.getvalue()
+        finally:
+            self._o = strm
+
     def process(self, table, i):
         """Traverse the table depth-first from i-th element.
         """
         row = table[i]
         k, t, d = row[I_K], row[I_T], row[I_D] + 1
-        container = self.rf.row(k, t, d)
+        note = self._notes[i] if self._notes else None
+        container = self.rf.row(k, t, d, note=note)
         if container:
-            children = [j for j in range(len(table))
-                        if table[j][I_P] == i]
+            children = self._children[i]
             self.process_children(table, i, container, children)
 
+    def process_roots(self, schema):
+        """Traverse the table of `schema` depth-first from each top-level
+        element, using the child index of the schema.
+        """
+        self._children = schema.children
+        if self.stats is not None:
+            self._notes = [self.stats.summary(path)
+                           for path, _ in schema.paths()]
+        for i in schema.roots:
+            self.process(schema.table, i)
+
     @abc.abstractmethod
     def process_children(self, table, i, container, children):
         pass
@@ -190,9 +258,7 @@ class JsonSchemaReport(Report):
         # wrap in outer object
         self.rf.row('', 'dict', 0)
         # process top-level elements
-        for i in range(len(schema.table)):
-            if schema.table[i][I_P] < 0:
-                self.process(schema.table, i)
+        self.process_roots(schema)
         # finish up
         self.rf.done()
 
@@ -215,12 +281,50 @@ class TextReport(Report):
     def write_schema(self, schema):
         self.rf = Textify(output_stream=self._o)
         # process top-level elements
-        for i in range(len(schema.table)):
-            if schema.table[i][I_P] < 0:
-                self.process(schema.table, i)
+        self.process_roots(schema)
         # finish up
         self.rf.done()
 
     def process_children(self, table, i, container, children):
         for child in children:
-            self.process(table, child)
\ No newline at end of file
+            self.process(table, child)
+
+
+class FileWriter(object):
+    """Write whole files in a bounded pool of threads.
+
+    At most `pending` files, rendered but not yet written, are held in
+    memory; :meth:`write` blocks until one of them is done. Errors are
+    raised by :meth:`close`, which waits for all the files to be written.
+    """
+    def __init__(self, workers=4, pending=None):
+        self._pool = futures.ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(pending or 2 * workers)
+        self._futures = []
+
+    def write(self, path, text):
+        self._slots.acquire()
+        try:
+            fut = self._pool.submit(self._write, path, text)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(fut)
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        done, self._futures = self._futures, []
+        for fut in done:
+            fut.result()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,192 @@
+"""
+Statistics on the fields of documents: how often each path is present,
+the mix of types found there, and the approximate number of distinct
+scalar values, kept in constant memory per path.
+
+Paths are those of :meth:`alsdata.core.Schema.paths`, e.g. "numbers[].num".
+"""
+import hashlib
+import math
+import struct
+from bson import Binary
+
+_UINT64 = struct.Struct('<Q')
+
+
+def value_hash(value) -> int:
+    """64-bit hash of a scalar value that is the same in every process.
+    """
+    data = (type(value).__name__ + ':' + repr(value)).encode('utf-8')
+    return _UINT64.unpack(hashlib.blake2b(data, digest_size=8).digest())[0]
+
+
+class HyperLogLog(object):
+    """Approximate count of distinct values, with ``2 ** p`` one-byte
+    registers. The standard error is about ``1.04 / sqrt(2 ** p)``, i.e.
+    about 3% for the default `p` of 10.
+    """
+    def __init__(self, p=10):
+        if not 4 <= p <= 16:
+            raise ValueError('HyperLogLog precision must be from 4 to 16')
+        self.p = p
+        self._m = 1 << p
+        self._reg = bytearray(self._m)
+
+    def add_hash(self, h: int):
+        """Add a value, given by its 64-bit hash.
+        """
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if rank > self._reg[idx]:
+            self._reg[idx] = rank
+
+    def add(self, value):
+        self.add_hash(value_hash(value))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('Cannot merge HyperLogLog sketches of different '
+                             'precision ({:d} and {:d})'.format(self.p,
+                                                                other.p))
+        self._reg = bytearray(map(max, self._reg, other._reg))
+
+    def count(self) -> int:
+        m = self._m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        est = alpha * m * m / sum(2.0 ** -r for r in self._reg)
+        zeros = self._reg.count(0)
+        if est <= 2.5 * m and zeros:
+            est = m * math.log(m / float(zeros))  # linear counting
+        return int(round(est))
+
+    def to_dict(self) -> dict:
+        return {'p': self.p, 'registers': Binary(bytes(self._reg))}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        hll = cls(p=d['p'])
+        hll._reg = bytearray(d['registers'])
+        return hll
+
+
+class PathStats(object):
+    """Statistics for one path: the number of documents in which it is
+    present, the number of values of each type, and a
+    :class:`HyperLogLog` of the distinct scalar values.
+    """
+    def __init__(self, p=10):
+        self.present = 0
+        self.types = {}
+        self.distinct = HyperLogLog(p)
+
+    def merge(self, other):
+        self.present += other.present
+        for t, n in other.types.items():
+            self.types[t] = self.types.get(t, 0) + n
+        self.distinct.merge(other.distinct)
+
+    def to_dict(self) -> dict:
+        return {'present': self.present, 'types': self.types,
+                'distinct': self.distinct.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        ps = cls()
+        ps.present, ps.types = d['present'], dict(d['types'])
+        ps.distinct = HyperLogLog.from_dict(d['distinct'])
+        return ps
+
+
+class FieldStats(object):
+    """Per-path statistics over a set of documents.
+
+    Documents are added by a :class:`alsdata.core.SchemaFactory` created
+    with this object as its `stats`, which passes in its type names and
+    array sampling.
+    """
+    SCALARS = ('int', 'float', 'str')
+
+    def __init__(self, p=10):
+        self.p = p
+        self.count = 0  # number of documents
+        self.paths = {}
+
+    def add(self, doc: dict, type_name, array_items):
+        """Add the fields of `doc`. Types are named by `type_name(value)`,
+        and only the `array_items(arr)` of each array are visited.
+
+        Nested values are walked with an explicit stack, not by recursion,
+        as in :meth:`alsdata.core.SchemaFactory.process`.
+        """
+        self.count += 1
+        seen = set()
+        get_path = self._path
+        # (iterator over the contents of a container, the path of the
+        # container, and whether it is an array), for each open one
+        stack = [(iter(doc.items()), '', False)]
+        while stack:
+            it, prefix, is_array = stack[-1]
+            for item in it:
+                if is_array:
+                    path, val = prefix + '[]', item
+                else:
+                    key, val = item
+                    if key == '_id':
+                        continue
+                    path = prefix + '.' + key if prefix else key
+                t = type_name(val)
+                ps = get_path(path)
+                seen.add(path)
+                ps.types[t] = ps.types.get(t, 0) + 1
+                if t == 'dict':
+                    stack.append((iter(val.items()), path, False))
+                    break
+                if t == 'array':
+                    stack.append((iter(array_items(val)), path, True))
+                    break
+                ps.distinct.add(val)
+            else:
+                stack.pop()
+        for path in seen:
+            self._path(path).present += 1
+
+    def _path(self, path):
+        ps = self.paths.get(path)
+        if ps is None:
+            ps = self.paths[path] = PathStats(self.p)
+        return ps
+
+    def merge(self, other):
+        """Add the statistics of `other`, e.g. from another worker.
+        """
+        self.count += other.count
+        for path, ps in other.paths.items():
+            self._path(path).merge(ps)
+
+    def summary(self, path: str) -> dict:
+        """Presence count and fraction, type counts and approximate number
+        of distinct values at `path`, or None if it was never seen.
+        """
+        ps = self.paths.get(path)
+        if ps is None:
+            return None
+        d = {'count': ps.present,
+             'fraction': ps.present / float(self.count) if self.count else 0,
+             'types': dict(ps.types)}
+        if any(t in self.SCALARS for t in ps.types):
+            d['distinct'] = ps.distinct.count()
+        return d
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'p': self.p,
+                'paths': {path: ps.to_dict()
+                          for path, ps in self.paths.items()}}
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        fs = cls(p=d['p'])
+        fs.count = d['count']
+        fs.paths = {path: PathStats.from_dict(ps)
+                    for path, ps in d['paths'].items()}
+        return fs
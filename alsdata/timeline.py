@@ -0,0 +1,161 @@
+"""
+When each schema was seen: per-schema histograms of document dates, and
+an index over them that answers time-window and first-seen queries.
+
+Dates are seconds since the epoch, as in
+:attr:`alsdata.core.Schema.timestamp`. They are counted in buckets of one
+hour, day or week (weeks start on Monday), numbered from the epoch.
+"""
+import bisect
+import collections
+
+#: Bucket widths, in seconds
+UNITS = collections.OrderedDict([('hour', 3600), ('day', 86400),
+                                 ('week', 7 * 86400)])
+
+# The epoch was a Thursday; weeks are counted from the Monday before
+_ORIGIN = {'hour': 0, 'day': 0, 'week': -3 * 86400}
+
+
+class Timeline(object):
+    """Number of documents of each schema per bucket of time.
+
+    Filled in by :meth:`alsdata.core.SchemaSet.add` for a set whose
+    `timeline` is set to one of these.
+    """
+    def __init__(self, unit='day'):
+        if unit not in UNITS:
+            raise ValueError('Unknown timeline unit "{}", expected one of: '
+                             '{}'.format(unit, ', '.join(UNITS)))
+        self.unit = unit
+        self._width = UNITS[unit]
+        self._origin = _ORIGIN[unit]
+        self.counts = {}  # schema => {bucket: count}
+
+    def bucket(self, ts: float) -> int:
+        """Number of the bucket of the date `ts`.
+        """
+        return int((ts - self._origin) // self._width)
+
+    def bucket_start(self, b: int) -> float:
+        """Date at which bucket `b` starts.
+        """
+        return float(b * self._width + self._origin)
+
+    def add(self, s, ts, n=1):
+        """Count `n` documents with schema `s` at date `ts`, if not None.
+        """
+        if ts is None:
+            return
+        hist = self.counts.get(s)
+        if hist is None:
+            hist = self.counts[s] = {}
+        b = int((ts - self._origin) // self._width)
+        hist[b] = hist.get(b, 0) + n
+
+    def merge(self, other):
+        if other.unit != self.unit:
+            raise ValueError('Cannot merge timelines by {} and by {}'
+                             .format(self.unit, other.unit))
+        for s, hist in other.counts.items():
+            mine = self.counts.setdefault(s, {})
+            for b, n in hist.items():
+                mine[b] = mine.get(b, 0) + n
+
+    def histogram(self, s) -> list:
+        """(bucket, count) pairs of schema `s`, in time order.
+        """
+        return sorted(self.counts.get(s, {}).items())
+
+    def to_dict(self, schemas) -> dict:
+        """Timeline as JSON-able values, with the histograms of `schemas`
+        (a list) in the same order. Buckets are delta-encoded.
+        """
+        hists = []
+        for s in schemas:
+            prev, buckets, counts = 0, [], []
+            for b, n in self.histogram(s):
+                buckets.append(b - prev)
+                counts.append(n)
+                prev = b
+            hists.append([buckets, counts])
+        return {'unit': self.unit, 'histograms': hists}
+
+    @classmethod
+    def from_dict(cls, d: dict, schemas):
+        tl = cls(unit=d['unit'])
+        for s, (buckets, counts) in zip(schemas, d['histograms']):
+            hist, b = {}, 0
+            for delta, n in zip(buckets, counts):
+                b += delta
+                hist[b] = n
+            if hist:
+                tl.counts[s] = hist
+        return tl
+
+
+class TimelineIndex(object):
+    """Index over the timeline of a :class:`alsdata.core.SchemaSet`.
+
+    Built once, in time linear in the number of (schema, bucket) pairs
+    and of paths. Then :meth:`live` takes time logarithmic in the number
+    of buckets plus the size of the answer, and :meth:`first_seen`
+    constant time.
+    """
+    def __init__(self, schemas):
+        tl = schemas.timeline
+        if tl is None:
+            raise ValueError('Schemas have no timeline')
+        self.timeline = tl
+        by_bucket = {}
+        for s, hist in tl.counts.items():
+            for b, n in hist.items():
+                by_bucket.setdefault(b, []).append((s, n))
+        self._buckets = sorted(by_bucket)
+        self._live = [by_bucket[b] for b in self._buckets]
+        # earliest and latest date of each path, from the exact date
+        # ranges of the schemas
+        self._seen = {}
+        for (first, last), s, _ in schemas.items_bydate():
+            if first is None:
+                continue
+            t0, t1 = first.timestamp(), last.timestamp()
+            for path, _ in s.paths():
+                seen = self._seen.get(path)
+                if seen is None:
+                    self._seen[path] = [t0, t1]
+                else:
+                    if t0 < seen[0]:
+                        seen[0] = t0
+                    if t1 > seen[1]:
+                        seen[1] = t1
+
+    def live(self, start: float, end: float) -> dict:
+        """Schemas of the documents dated from `start` up to, but not
+        including, `end`, with their number of documents in that window,
+        to the resolution of one bucket.
+        """
+        tl = self.timeline
+        i = bisect.bisect_left(self._buckets, tl.bucket(start))
+        j = bisect.bisect_left(self._buckets, tl.bucket(end - 1e-6) + 1)
+        found = {}
+        for entries in self._live[i:j]:
+            for s, n in entries:
+                found[s] = found.get(s, 0) + n
+        return found
+
+    def paths(self) -> list:
+        """All paths of the schemas, in no particular order.
+        """
+        return list(self._seen)
+
+    def first_seen(self, path: str):
+        """Earliest date of a document with the field `path` (see
+        :meth:`alsdata.core.Schema.paths`), or None if it was never seen.
+        """
+        seen = self._seen.get(path)
+        return seen and seen[0]
+
+    def last_seen(self, path: str):
+        seen = self._seen.get(path)
+        return seen and seen[1]
@@ -0,0 +1,196 @@
+"""
+Check documents against a known set of schemas, e.g. one saved by
+``mongoexplorer -S``, and report those whose shape was never seen.
+
+A :class:`Validator` compiles the shapes it sees into a matcher: each
+dict is looked up by its keys and the exact types of its values, which
+takes a few C-level operations, and gets an id from those and the ids
+of the dicts and arrays it holds; each array gets an id from the set of
+the types and ids of its items. Documents with the same id have the
+same schema, so the verdict for each id is computed once and then
+looked up; only documents of a new shape pay for the schema extraction
+and the comparison with the known schemas. Documents with values of
+other types (e.g. subclasses of dict), or nested too deeply, are keyed
+by :meth:`alsdata.core.SchemaFactory.fingerprint` instead.
+"""
+from .core import (CompareResult, SchemaFactory, diff_path_types,
+                   _FingerprintTooLong)
+
+_SCALARS = frozenset((int, bool, float, str))
+
+
+class Validator(object):
+    """Matcher of documents against the schemas of a
+    :class:`alsdata.core.SchemaSet`.
+
+    Verdicts of up to `cache_size` shapes are kept; beyond that, or if
+    the matcher grows to `SHAPE_NODES` times as many dict and array
+    shapes, it starts over.
+
+    Attributes:
+        docs: Number of documents checked
+        failed: Number of those with an unknown schema
+        new_shapes: Distinct unknown schemas seen
+    """
+    #: Default number of shapes whose verdict is kept
+    CACHE_SIZE = 4096
+    #: Dict and array shapes kept per verdict, on average, at most
+    SHAPE_NODES = 64
+    #: Documents nested deeper than this are keyed by their fingerprint
+    MAX_DEPTH = 100
+
+    def __init__(self, schemas, cache_size=CACHE_SIZE):
+        self._known = set(schemas)
+        # in the order of the set, so that ties are always broken alike
+        self._types = [(s, s.path_types()) for s in schemas]
+        self._factory = SchemaFactory(cache_size=0)
+        self._cache_size = cache_size
+        self._verdicts = {}  # shape id or fingerprint => None/CompareResult
+        self._results = {}  # unknown schema => CompareResult
+        self._dicts = {}  # (keys, types) => see _plan()
+        self._ids = {}  # dict or array shape => id
+        self.docs, self.failed = 0, 0
+
+    @property
+    def new_shapes(self) -> int:
+        return len(self._results)
+
+    def check(self, doc: dict):
+        """None if `doc` has one of the known schemas, otherwise a full
+        :class:`alsdata.core.CompareResult` between the closest known
+        schema and that of `doc`: paths only `doc` has are `added`.
+        """
+        self.docs += 1
+        key = self._dict_id(doc, 0)
+        if key is None:
+            try:
+                key = self._factory.fingerprint(doc)
+            except _FingerprintTooLong:
+                key = None
+        try:
+            result = self._verdicts[key]
+        except KeyError:
+            result = self._judge(doc)
+            if len(self._verdicts) >= self._cache_size or \
+                    len(self._ids) > self.SHAPE_NODES * self._cache_size:
+                # ids are numbered from 0 again, so `key` is stale too
+                self._verdicts.clear()
+                self._dicts.clear()
+                self._ids.clear()
+            elif key is not None:
+                self._verdicts[key] = result
+        if result is not None:
+            self.failed += 1
+        return result
+
+    def validate(self, docs):
+        """Check each of `docs` and yield (id, result) for those with an
+        unknown schema, see :meth:`check`.
+        """
+        check = self.check
+        for doc in docs:
+            result = check(doc)
+            if result is not None:
+                yield doc.get('_id'), result
+
+    def _dict_id(self, obj, depth):
+        """Shape id of the dict `obj`, or None if it has values of other
+        types than plain scalars, dicts and arrays, or is too deep.
+
+        Shapes are compared with the exact types of the values, so two
+        dicts with the same id have the same schema, as that only depends
+        on their keys and type names; the converse may not hold, e.g. for
+        the same keys in another order, which only costs another verdict.
+        """
+        values = tuple(obj.values())
+        key = (tuple(obj), tuple(map(type, values)))
+        plan = self._dicts.get(key)
+        if plan is None:
+            plan = self._dicts[key] = self._plan(key)
+        if not plan:
+            return None
+        id_, containers = plan
+        if not containers:
+            return id_
+        if depth >= self.MAX_DEPTH:
+            return None
+        shape = [id_]
+        for i, shape_id in containers:
+            sub = shape_id(values[i], depth + 1)
+            if sub is None:
+                return None
+            shape.append(sub)
+        ids = self._ids
+        return ids.setdefault(tuple(shape), len(ids))
+
+    def _plan(self, key):
+        """Id of the keys and types of a dict, and the index of each of its
+        dict and array values with the method that gives its shape id;
+        False if it has values of other types. The `_id` field, which
+        schemas leave out, can have any type.
+        """
+        keys, types = key
+        containers = []
+        for i, (k, t) in enumerate(zip(keys, types)):
+            if k == '_id':
+                continue
+            if t is dict:
+                containers.append((i, self._dict_id))
+            elif t is list:
+                containers.append((i, self._array_id))
+            elif t not in _SCALARS:
+                return False
+        ids = self._ids
+        return ids.setdefault(key, len(ids)), tuple(containers)
+
+    def _array_id(self, arr, depth):
+        """Shape id of the array `arr`, from the set of the types of its
+        scalars and of the ids of its dicts and arrays, as repeated items
+        do not change its schema; None as for :meth:`_dict_id`.
+        """
+        ids = self._ids
+        types = frozenset(map(type, arr))
+        if types <= _SCALARS:
+            return ids.setdefault(types, len(ids))
+        if depth >= self.MAX_DEPTH:
+            return None
+        items, dict_id, array_id = set(), self._dict_id, self._array_id
+        for value in arr:
+            t = type(value)
+            if t is dict:
+                sub = dict_id(value, depth + 1)
+            elif t is list:
+                sub = array_id(value, depth + 1)
+            elif t in _SCALARS:
+                sub = t
+            else:
+                return None
+            if sub is None:
+                return None
+            items.add(sub)
+        return ids.setdefault(('[]', frozenset(items)), len(ids))
+
+    def _judge(self, doc):
+        s = self._factory.process(doc)
+        if s in self._known:
+            return None
+        result = self._results.get(s)
+        if result is None:
+            result = self._results[s] = self._closest(s)
+        return result
+
+    def _closest(self, s) -> CompareResult:
+        """Full comparison with the known schema that differs from `s` in
+        the fewest paths, the first one of the set if there are several,
+        see :meth:`alsdata.core.Schema.compare`.
+        """
+        types, best, nbest = s.path_types(), None, None
+        for known, known_types in self._types:
+            diff = diff_path_types(known_types, types)
+            n = len(diff.added) + len(diff.removed) + len(diff.retyped)
+            if nbest is None or n < nbest:
+                best, nbest = known, n
+        if best is None:
+            return diff_path_types({}, types, CompareResult(
+                CompareResult.LENGTH, 0, len(s.table)))
+        return best.compare(s, full=True)
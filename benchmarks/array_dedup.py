@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for schema extraction of documents with long scalar arrays,
+such as detector readouts and file lists.
+
+Prints the time per array element for arrays of 10^4 .. 10^N scalars;
+this should stay flat as the arrays grow.
+
+Run from the top-level directory:
+
+    PYTHONPATH=. python benchmarks/array_dedup.py [N]
+"""
+import sys
+import timeit
+from alsdata import core
+
+
+def make_doc(n):
+    return {'readout': [float(i) for i in range(n)],
+            'files': ['scan_{:07d}.h5'.format(i) for i in range(n)],
+            'mixed': [i if i % 2 else str(i) for i in range(n)]}
+
+
+def run(n, repeat=3):
+    """Best time, in seconds, to process one document with arrays of
+    `n` elements. The fingerprint cache is off, so that every run goes
+    through :meth:`alsdata.core.Schema.add`.
+    """
+    doc, sf = make_doc(n), core.SchemaFactory(cache_size=0)
+    return min(timeit.repeat(lambda: sf.process(doc), number=1,
+                             repeat=repeat))
+
+
+def main():
+    max_exp = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    print('{:>10s} {:>12s} {:>14s}'.format('elements', 'seconds',
+                                           'ns/element'))
+    for exp in range(4, max_exp + 1):
+        n = 10 ** exp
+        t = run(n)
+        nelem = 3 * n
+        print('{:10d} {:12.4f} {:14.1f}'.format(nelem, t, 1e9 * t / nelem))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
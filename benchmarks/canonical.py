@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark for the identity of schemas: the interned tree id now used by
+Schema.__hash__ and __eq__ (and by the array item check), against the
+canonical sort of the table and hash of the sorted rows it replaced.
+
+Documents are rebuilt from the real schemas listed in a text report (by
+default the one in data/), and both are timed per row, along with a whole
+uncached process() and SchemaSet.add(). The same is done for synthetic
+documents whose arrays hold many distinct items, where the sort dominates.
+
+Run from the top-level directory:
+
+    PYTHONPATH=. python benchmarks/canonical.py [REPORT]
+"""
+import os
+import re
+import sys
+import timeit
+from alsdata import core
+
+DEFAULT_REPORT = os.path.join(os.path.dirname(__file__), '..', 'data',
+                              'alsdata-schemas-24Aug2017.txt')
+
+_ROW = re.compile(r'( *)- (?:(.*?)(\{\}|\[\])|(?:(.*): )?(\w+))$')
+_VALUES = {'int': 1, 'float': 1.5, 'str': '2017-08-24'}
+
+
+def read_documents(path):
+    """One document per schema in a text report, with the same shape.
+    """
+    docs, stack = [], None
+    with open(path) as f:
+        for line in f:
+            if line.startswith('# Count'):
+                stack = [(-1, {})]
+                docs.append(stack[0][1])
+                continue
+            m = _ROW.match(line.rstrip('\n'))
+            if stack is None or m is None:
+                continue
+            indent, ckey, csym, key, type_ = m.groups()
+            level = len(indent) // 2
+            while stack[-1][0] >= level:
+                stack.pop()
+            if csym:
+                value, key = ({} if csym == '{}' else []), ckey
+            else:
+                value = _VALUES.get(type_, 'x')
+            parent = stack[-1][1]
+            if isinstance(parent, list):
+                parent.append(value)
+            else:
+                parent[key] = value
+            if csym:
+                stack.append((level, value))
+    return docs
+
+
+def raw_rows(sf, doc):
+    """Rows of the schema of `doc`, before they are put in canonical form.
+    """
+    sf._schema = core.Schema()
+    sf._process_dict(-1, 0, doc)
+    return list(sf._schema._table)
+
+
+def wide_documents(n, width):
+    """`n` documents, each with an array of `width` dicts of distinct keys.
+    """
+    return [{'a': [{'k{:d}'.format((i + j) % (2 * width)): {'x': j}}
+                   for j in range(width)], 'b': i} for i in range(n)]
+
+
+def sorted_id(rows):
+    """The former identity: hash of the table in canonical order.
+    """
+    return hash(tuple(core._canonical(rows)))
+
+
+def run(name, docs):
+    sf = core.SchemaFactory(cache_size=0)
+    tables = [raw_rows(sf, d) for d in docs]
+    nrows = sum(len(t) for t in tables)
+    print('{}: {:d} documents, {:d} rows'.format(name, len(docs), nrows))
+    for label, func in (('sort+hash', sorted_id), ('tree id', core._tree_id)):
+        t = min(timeit.repeat(lambda: [func(rows) for rows in tables],
+                              number=10, repeat=3)) / 10
+        print('  {:10s} {:8.2f} ms {:8.1f} ns/row'
+              .format(label, 1e3 * t, 1e9 * t / nrows))
+
+    def process_all():
+        schemas = core.SchemaSet()
+        for i, d in enumerate(docs):
+            schemas.add(sf.process(d), i)
+        return schemas
+    t = min(timeit.repeat(process_all, number=3, repeat=3)) / 3
+    print('  process(): {:8.2f} ms (uncached, {:d} schemas)'
+          .format(1e3 * t, len(process_all())))
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_REPORT
+    run('report', read_documents(path))
+    run('wide', wide_documents(200, 200))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Benchmark suite for the schema pipeline, on synthetic documents from
+:class:`alsdata.generate.DocumentGenerator`, so no database is needed.
+
+Stages, each timed on its own:
+
+    extract          SchemaFactory.process() of every document
+    extract_nocache  the same, without the cache of recently seen shapes
+    insert           SchemaSet.add() of every extracted schema
+    render           text and JSON Schema reports of every distinct schema
+    diff             diff_schemas() of every pair of distinct schemas
+    validate         Validator.check() of every document, against the
+                     schemas of the first half of them
+
+For each stage the best of `--repeat` runs gives the rate, in items (see
+"unit") per second. A separate run under tracemalloc gives the peak memory
+allocated during the stage, the change in the number of allocated memory
+blocks (objects kept by the stage), and the number of garbage collections,
+which grows with the number of container objects allocated.
+
+Results are written as JSON with -o, and compared with earlier results
+with -c; the exit status is 1 if a stage got slower, or used more memory,
+by more than the tolerance.
+
+Run from the top-level directory:
+
+    PYTHONPATH=. python benchmarks/suite.py -n 5000 -o results.json
+    PYTHONPATH=. python benchmarks/suite.py -n 5000 -c results.json
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from alsdata import core, diff, generate, report, validate
+
+#: Version of the results format
+RESULTS_VERSION = 1
+
+
+class Stage(object):
+    """A benchmark stage: `setup()` returns the argument of `run()`, which
+    returns the number of items processed.
+    """
+    def __init__(self, name, unit, setup, run):
+        self.name, self.unit = name, unit
+        self.setup, self.run = setup, run
+
+
+def _extract(cache_size):
+    def run(docs):
+        sf = core.SchemaFactory(cache_size=cache_size)
+        for doc in docs:
+            sf.process(doc)
+        return len(docs)
+    return run
+
+
+def _insert(pairs):
+    schemas = core.SchemaSet()
+    for s, id_ in pairs:
+        schemas.add(s, id_)
+    return len(pairs)
+
+
+def _render(schemas):
+    reporters = (report.TextReport(None), report.JsonSchemaReport(None))
+    for s in schemas:
+        for r in reporters:
+            r.render(s)
+    return len(schemas)
+
+
+def _diff(schemas):
+    return sum(1 for _ in diff.diff_schemas(schemas))
+
+
+def _validate(args):
+    schemas, docs = args
+    v = validate.Validator(schemas)
+    for doc in docs:
+        v.check(doc)
+    return len(docs)
+
+
+def make_stages(docs):
+    sf = core.SchemaFactory()
+    extracted = [(sf.process(doc), doc['_id']) for doc in docs]
+    schemas = core.SchemaSet()
+    for s, id_ in extracted:
+        schemas.add(s, id_)
+    distinct = [s for _, s, _ in schemas.items_bydate()]
+    known = core.SchemaSet()
+    for s, id_ in extracted[:len(extracted) // 2]:
+        known.add(s, id_)
+    return [
+        Stage('extract', 'docs', lambda: docs,
+              _extract(core.SchemaFactory.CACHE_SIZE)),
+        Stage('extract_nocache', 'docs', lambda: docs, _extract(0)),
+        Stage('insert', 'docs', lambda: extracted, _insert),
+        Stage('render', 'schemas', lambda: distinct, _render),
+        Stage('diff', 'pairs', lambda: distinct, _diff),
+        Stage('validate', 'docs', lambda: (known, docs), _validate),
+    ]
+
+
+def measure(stage, repeat=3) -> dict:
+    arg = stage.setup()
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = stage.run(arg)
+        t = time.perf_counter() - t0
+        best = t if best is None else min(best, t)
+    # memory, in a separate run as tracing slows everything down
+    gc.collect()
+    ngc = sum(g['collections'] for g in gc.get_stats())
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    blocks = sys.getallocatedblocks()
+    stage.run(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    ngc = sum(g['collections'] for g in gc.get_stats()) - ngc
+    return {'unit': stage.unit, 'items': n, 'seconds': best,
+            'rate': n / best if best > 0 else 0.0,
+            'peak_bytes': peak - base, 'blocks': blocks,
+            'gc_collections': ngc}
+
+
+def compare(old, new, tolerance) -> list:
+    """Stages of `new` that are slower, or use more memory, than in `old`
+    by more than the fraction `tolerance`, as (stage, message) pairs.
+    """
+    worse = []
+    for name, res in new['results'].items():
+        prev = old['results'].get(name)
+        if prev is None:
+            continue
+        if res['rate'] < prev['rate'] * (1 - tolerance):
+            worse.append((name, 'rate {:.1f} -> {:.1f} {}/s'.format(
+                prev['rate'], res['rate'], res['unit'])))
+        if res['peak_bytes'] > prev['peak_bytes'] * (1 + tolerance):
+            worse.append((name, 'peak memory {:d} -> {:d} bytes'.format(
+                prev['peak_bytes'], res['peak_bytes'])))
+    return worse
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split('\n\n')[0],
+                                 formatter_class=argparse.
+                                 RawDescriptionHelpFormatter)
+    ap.add_argument('-n', '--docs', type=int, default=2000,
+                    help='Number of documents (default=%(default)d)')
+    ap.add_argument('--seed', type=int, default=0,
+                    help='Random seed (default=%(default)d)')
+    ap.add_argument('--depth', type=int, default=3,
+                    help='Levels of nesting (default=%(default)d)')
+    ap.add_argument('--width', type=int, default=8,
+                    help='Fields per dict (default=%(default)d)')
+    ap.add_argument('--array-len', type=int, default=5,
+                    help='Average array length (default=%(default)d)')
+    ap.add_argument('--shapes', type=int, default=20,
+                    help='Distinct document shapes (default=%(default)d)')
+    ap.add_argument('--no-nested-arrays', action='store_true',
+                    help='No arrays of dicts')
+    ap.add_argument('-r', '--repeat', type=int, default=3,
+                    help='Timed runs per stage (default=%(default)d)')
+    ap.add_argument('-s', '--stage', action='append', default=None,
+                    help='Run only this stage (repeatable)')
+    ap.add_argument('-o', '--output', default=None,
+                    help='Write results, as JSON, to this file')
+    ap.add_argument('-c', '--compare', default=None, metavar='FILE',
+                    help='Compare with results in FILE')
+    ap.add_argument('--tolerance', type=float, default=0.1,
+                    help='Fraction by which a stage may get worse before '
+                         'it counts as a regression (default=%(default)s)')
+    args = ap.parse_args()
+
+    params = {'docs': args.docs, 'seed': args.seed, 'depth': args.depth,
+              'width': args.width, 'array_len': args.array_len,
+              'shapes': args.shapes,
+              'nested_arrays': not args.no_nested_arrays}
+    gen = generate.DocumentGenerator(
+        seed=args.seed, depth=args.depth, width=args.width,
+        array_len=args.array_len, shapes=args.shapes,
+        nested_arrays=not args.no_nested_arrays)
+    docs = list(gen.documents(args.docs))
+    results = {}
+    print('{:16s} {:>8s} {:>9s} {:>17s} {:>12s} {:>10s} {:>5s}'.format(
+        'stage', 'items', 'seconds', 'rate', 'peak KiB', 'blocks', 'gc'))
+    for stage in make_stages(docs):
+        if args.stage and stage.name not in args.stage:
+            continue
+        res = results[stage.name] = measure(stage, repeat=args.repeat)
+        print('{:16s} {:8d} {:9.4f} {:>17s} {:12.1f} {:10d} {:5d}'.format(
+            stage.name, res['items'], res['seconds'],
+            '{:.0f} {}/s'.format(res['rate'], res['unit']),
+            res['peak_bytes'] / 1024., res['blocks'],
+            res['gc_collections']))
+    data = {'version': RESULTS_VERSION, 'params': params,
+            'python': platform.python_version(),
+            'platform': platform.platform(), 'time': time.time(),
+            'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if old.get('params') != params:
+            print('Warning: parameters differ from those of {}'
+                  .format(args.compare))
+        worse = compare(old, data, args.tolerance)
+        for name, msg in worse:
+            print('REGRESSION {}: {}'.format(name, msg))
+        if worse:
+            return 1
+        print('No regressions (tolerance {:.0%})'.format(args.tolerance))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
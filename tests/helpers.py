@@ -0,0 +1,18 @@
+"""
+Helpers shared by the unit tests
+"""
+from alsdata import core
+from alsdata import timeline as schema_timeline
+
+
+def schema_set(docs, timeline=None):
+    """SchemaSet of `docs`, with their `_id` (or their position, if they
+    have none) as ids. With a `timeline` unit, e.g. "day", their dates are
+    counted in its timeline.
+    """
+    ss, sf = core.SchemaSet(), core.SchemaFactory()
+    if timeline:
+        ss.timeline = schema_timeline.Timeline(unit=timeline)
+    for i, d in enumerate(docs):
+        ss.add(sf.process(d), d.get('_id', i))
+    return ss
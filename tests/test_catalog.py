@@ -0,0 +1,74 @@
+"""
+Unit tests for .catalog
+"""
+import sqlite3
+from alsdata import catalog
+from alsdata import core
+from .helpers import schema_set
+
+
+def _catalog(tmpdir):
+    cat = catalog.Catalog(str(tmpdir.join('catalog.db')))
+    cat.add_schemas('als', 'files', schema_set([
+        {'_id': i, 'time': i, 'fs': {'mode': 'rw', 'size': i}}
+        for i in range(5)] + [
+        {'_id': 5, 'time': 10, 'fs': {'mode': 1}, 'numbers': [{'num': 1}]}]))
+    cat.add_schemas('als', 'scans', schema_set([
+        {'_id': 'a', 'time': 1, 'numbers': [{'num': 'x'}, {'num': 2}]}]))
+    return cat
+
+
+def test_query(tmpdir):
+    cat = _catalog(tmpdir)
+    found = cat.query('fs.mode')
+    assert [(m.collection, m.number, m.type, m.count) for m in found] == [
+        ('files', 0, 'str', 5), ('files', 1, 'int', 1)]
+    assert found[0].sample_ids == [0, 1, 2]
+    assert found[0].first == 0 and found[0].last == 4
+    found = cat.query('numbers[].num', type_='int')
+    assert [(m.collection, m.sample_ids) for m in found] == [
+        ('files', [5]), ('scans', ['a'])]
+    assert len(cat.query('numbers[].num', collection='scans')) == 2
+    assert {m.path for m in cat.query('fs.*')} == {'fs.mode', 'fs.size'}
+    assert {m.path for m in cat.query('numbers[]*')} == {'numbers[]',
+                                                         'numbers[].num'}
+    assert cat.query('fs.dat') == []
+    # stored schemas are the same as the extracted ones
+    s = cat.schema(found[0].schema_id)
+    doc = {'_id': 5, 'time': 10, 'fs': {'mode': 1}, 'numbers': [{'num': 1}]}
+    assert s == core.SchemaFactory().process(doc)
+    assert s.timestamp == 10
+    cat.close()
+
+
+def test_replace_collection(tmpdir):
+    cat = _catalog(tmpdir)
+    cat.add_schemas('als', 'files', schema_set([{'_id': 1, 'a': 1}]))
+    assert cat.query('fs.mode') == []
+    assert [m.collection for m in cat.query('a')] == ['files']
+    assert cat.collections() == [('als', 'files', 1, 1),
+                                 ('als', 'scans', 1, 1)]
+    cat.close()
+    # re-opened from disk
+    with catalog.Catalog(cat.path) as cat2:
+        assert len(cat2.query('numbers[].num')) == 2
+    db = sqlite3.connect(cat.path)
+    db.execute("UPDATE info SET value = '99' WHERE key = 'version'")
+    db.commit()
+    db.close()
+    try:
+        catalog.Catalog(cat.path)
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def test_fingerprint():
+    sf = core.SchemaFactory(cache_size=0)
+    s1 = sf.process({'a': [{'x': 1}, {'y': [{'z': 's'}, {'w': 1}]}]})
+    s2 = sf.process({'a': [{'y': [{'z': 't'}, {'w': 2}]}, {'x': 3}]})
+    assert s1 == s2 and s1.table != s2.table
+    assert catalog.fingerprint(s1) == catalog.fingerprint(s2)
+    assert catalog.fingerprint(s1) != catalog.fingerprint(
+        sf.process({'a': [{'x': 1}, {'y': [{'z': 1}, {'w': 1}]}]}))
@@ -0,0 +1,67 @@
+"""
+Unit tests for .cluster
+"""
+import random
+from alsdata import cluster
+from .helpers import schema_set
+
+
+def _brute_force(ss, threshold):
+    """Single-linkage clusters, as sets of tables, from all pairs.
+    """
+    schemas = list(ss)
+    feats = [cluster.features(s) for s in schemas]
+    label = list(range(len(schemas)))
+    for i in range(len(schemas)):
+        for j in range(i):
+            if cluster.jaccard(feats[i], feats[j]) >= threshold:
+                old, new = label[i], label[j]
+                label = [new if x == old else x for x in label]
+    groups = {}
+    for s, x in zip(schemas, label):
+        groups.setdefault(x, set()).add(s.table)
+    return sorted(map(sorted, groups.values()))
+
+
+def test_union_counts():
+    docs = [{'a': 1, 'b': 'x', 'c': 1.5, 'd': 1}] * 3 + \
+           [{'a': 1, 'b': 'x', 'c': 1.5}] * 2 + \
+           [{'z': [1]}]
+    clusters = cluster.cluster_schemas(schema_set(docs), threshold=0.7)
+    assert [(len(c.schemas), c.count) for c in clusters] == [(2, 5), (1, 1)]
+    assert clusters[0].union() == [('a', 'int', 5), ('b', 'str', 5),
+                                   ('c', 'float', 5), ('d', 'int', 3)]
+    assert clusters[1].union() == [('z', 'array', 1), ('z[]', 'int', 1)]
+
+
+def test_matches_brute_force():
+    rng = random.Random(1)
+    keys = ['k{:d}'.format(i) for i in range(12)]
+    docs = []
+    for fam in range(4):
+        base = rng.sample(keys, 6)
+        for _ in range(40):
+            d = {k: 1 for k in base if rng.random() < 0.85}
+            d['f{:d}'.format(fam)] = 'x'
+            docs.append(d)
+    ss = schema_set(docs)
+    for threshold in 0.5, 0.7, 0.9:
+        clusters = cluster.cluster_schemas(ss, threshold=threshold,
+                                           num_perm=128)
+        found = sorted(sorted(s.table for s in c.schemas) for c in clusters)
+        assert found == _brute_force(ss, threshold)
+        assert sum(c.count for c in clusters) == len(docs)
+
+
+def test_random_matches_brute_force():
+    # LSH may miss a pair now and then, but not for these seeds
+    for seed in range(100):
+        rng = random.Random(seed)
+        keys = ['k{:d}'.format(i) for i in range(rng.randint(4, 10))]
+        docs = [{k: 1 for k in keys if rng.random() < 0.6} or {'e': 1}
+                for _ in range(rng.randint(5, 40))]
+        ss = schema_set(docs)
+        threshold = rng.choice([0.4, 0.5, 0.6, 0.7, 0.8])
+        clusters = cluster.cluster_schemas(ss, threshold=threshold)
+        found = sorted(sorted(s.table for s in c.schemas) for c in clusters)
+        assert found == _brute_force(ss, threshold), seed
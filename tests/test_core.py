@@ -1,9 +1,12 @@
 """
 Unit tests for .core
 """
+import bson
 from six import StringIO
 from alsdata import core
+from alsdata import dump
 from alsdata import report
+from .helpers import schema_set
 
 
 def setup():
@@ -109,4 +112,219 @@ def _format_schema(s, output=False):
     s = strm.getvalue()
     if output:
         print(s)
-    return s
\ No newline at end of file
+    return s
+
+def _sample_docs():
+    docs = []
+    for i in range(20):
+        d = {'_id': i, 'date': 1000 + (i * 7919) % 97, 'name': 'doc'}
+        if i % 3 == 0:
+            d['numbers'] = [{'num': i, 'name': str(i)}]
+        if i % 4 == 0:
+            d['tags'] = ['a', 'b', i]
+        docs.append(d)
+    return docs
+
+
+def test_merge_matches_serial():
+    docs = _sample_docs()
+    serial = schema_set(docs)
+    merged = core.SchemaSet()
+    for lo, hi in (0, 5), (5, 12), (12, 20):
+        merged.merge(schema_set(docs[lo:hi]))
+    assert list(merged.items_bydate()) == list(serial.items_bydate())
+
+
+def test_snapshot_roundtrip(tmpdir):
+    schemas = schema_set(_sample_docs())
+    schemas.meta['collection'] = 'test'
+    path = str(tmpdir.join('schemas.snap'))
+    schemas.save(path)
+    loaded = core.SchemaSet.load(path)
+    assert loaded.meta == {'collection': 'test'}
+    assert list(loaded.items_bydate()) == list(schemas.items_bydate())
+    # loaded sets still merge with freshly extracted ones
+    loaded.merge(schema_set(_sample_docs()))
+    assert len(loaded) == len(schemas)
+    for s, ids in schemas.items():
+        assert loaded[s] == list(ids) + list(ids)
+
+
+def test_array_dedup_after_removed_item():
+    # The second item is a duplicate and is removed; the scalars seen in its
+    # array must not hide those of the array that replaces it in the table.
+    d = {'a': [{'x': [1]}, {'x': [1]}, {'x': ['s', 1]}]}
+    tbl = core.SchemaFactory().process(d).table
+    _type = core.Schema.Column.TYPE_IDX
+    assert sorted(row[_type] for row in tbl) == [
+        'array', 'array', 'array', 'dict', 'dict', 'int', 'int', 'str']
+
+
+def test_array_dedup_key_order():
+    # items with the same fields in another order have the same shape
+    d = {'steps': [{'name': 'a', 'n': 1}, {'n': 2, 'name': 'b'},
+                   {'name': 'c', 'n': 3}, {'name': 'd', 'n': 4.0}]}
+    tbl = core.SchemaFactory().process(d).table
+    _type = core.Schema.Column.TYPE_IDX
+    assert [row[_type] for row in tbl].count('dict') == 2
+
+
+def test_array_dedup_nested():
+    # arrays inside the items must not hide the items already seen; the
+    # second item used to be kept, as a copy of the first:
+    #   a array, '' dict x2, b array x2, '' dict x2, c int x2
+    d = {'a': [{'b': [{'c': 1}]}, {'b': [{'c': 1}]}]}
+    sf = core.SchemaFactory(cache_size=0)
+    assert sf.process(d).table == (
+        (0, 'a', 'array', -1), (1, '', 'dict', 0), (2, 'b', 'array', 1),
+        (3, '', 'dict', 2), (4, 'c', 'int', 3))
+    assert sf.process(d) == sf.process({'a': [{'b': [{'c': 1}]}]})
+    d = {'a': [{'b': [{'c': 1}]}, {'b': [{'c': 2}, {'c': 3}]}, {'d': 1}]}
+    _type = core.Schema.Column.TYPE_IDX
+    assert [row[_type] for row in sf.process(d).table].count('dict') == 3
+
+
+def test_canonical_order():
+    sf = core.SchemaFactory(cache_size=0)
+    # rows are sorted by depth, key and type
+    assert sf.process({'b': {'x': 1}, 'a': [1, 'x']}) == \
+        sf.process({'a': ['y', 2], 'b': {'x': 3}})
+    # the same tree in another order is the same schema, but items of one
+    # type in one array stay in document order in the table
+    d1 = {'a': [{'x': 1}, {'y': [{'z': 's'}, {'w': 1}]}]}
+    d2 = {'a': [{'y': [{'z': 't'}, {'w': 2}]}, {'x': 3}]}
+    s1, s2 = sf.process(d1), sf.process(d2)
+    assert s1 == s2 and hash(s1) == hash(s2)
+    assert s1.table != s2.table
+    assert sf.process({'a': [{'x': 1}, {'y': [{'z': 1}, {'w': 1}]}]}) != s1
+    # tables are loaded as they were saved
+    loaded = core.Schema.from_table([list(row) for row in s2.table])
+    assert loaded == s2 and loaded.table == s2.table
+
+
+def test_tree_id():
+    # same rows in another order (parents first), parents remapped: same id
+    rows = [(0, 'a', 'array', -1), (1, '', 'dict', 0), (2, 'b', 'int', 1),
+            (1, '', 'dict', 0), (2, 'c', 'int', 3), (0, 'd', 'str', -1)]
+    perm = [1, 3, 5, 2, 4, 0]
+    moved = [None] * len(rows)
+    for i, j in enumerate(perm):
+        d, k, t, p = rows[i]
+        moved[j] = (d, k, t, perm[p] if p >= 0 else -1)
+    assert core._tree_id(rows) == core._tree_id(moved)
+    # subtrees: the item starting at row 3 is not the one at row 1
+    assert core._tree_id(rows[:5], 3) != core._tree_id(rows[:3], 1)
+    assert core._tree_id(rows[:3], 1) == core._tree_id(
+        [(0, 'x', 'array', -1), (1, '', 'dict', 0), (2, 'b', 'int', 1)], 1)
+    assert core._tree_id(rows) != core._tree_id(rows[:5])
+
+
+def test_process_events():
+    d = {'_id': {'x': [1]}, 'time': 20, 'a': [{'b': [1, 'x']}, {'b': [2]},
+                                             {'c': {'_id': 1}}],
+         'd': {'e': 1.5, 'f': []}}
+    sf = core.SchemaFactory(cache_size=0)
+    s = sf.process_events(dump.bson_events(bson.BSON.encode(d)), d)
+    assert s.table == sf.process(d).table
+    assert s.timestamp == 20
+    try:
+        sf.process_events([('a', 'dict'), ('b', 'int')])
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def test_deep_document():
+    # deeper than the recursion limit
+    d = {'x': 1}
+    for i in range(3000):
+        d = {'a': d, 'b': [d, {'c': i}] if i % 1000 == 0 else i}
+    sf = core.SchemaFactory()
+    s = sf.process(d)
+    assert max(row[0] for row in s.table) > 3000
+    assert core.SchemaFactory(cache_size=0).process(d) == s
+
+
+def test_fingerprint_cache():
+    d1 = {'_id': 1, 'a': [1, 2, 'x'], 'b': {'c': 1.5}, 'date': 10}
+    d2 = {'_id': 2, 'a': [3, 'y', 'z', 4], 'b': {'c': 2.5}, 'date': 20}
+    d3 = {'_id': 3, 'a': ['y', 3], 'b': {'c': 2.5}, 'date': 30}
+    sf = core.SchemaFactory()
+    assert sf.fingerprint(d1) == sf.fingerprint(d2)
+    assert sf.fingerprint(d1) != sf.fingerprint(d3)
+    s1, s2, s3 = (sf.process(d) for d in (d1, d2, d3))
+    # same shape: shared table, own date
+    assert s2.table is s1.table
+    assert s2.date > s1.date
+    uncached = core.SchemaFactory(cache_size=0)
+    for d, s in zip((d1, d2, d3), (s1, s2, s3)):
+        assert uncached.process(d).table == s.table
+    schemas = core.SchemaSet()
+    for d, s in zip((d1, d2, d3), (s1, s2, s3)):
+        schemas.add(s, d['_id'])
+    assert len(schemas) == 1
+
+
+def test_fingerprint_repeated_items():
+    # arrays of records of any length have one fingerprint
+    sf = core.SchemaFactory()
+    docs = [{'_id': n, 'a': [{'b': i, 'c': [{'d': 'x'}] * n}
+                             for i in range(n)] + [1, 'y']}
+            for n in range(1, 30)]
+    assert len({sf.fingerprint(d) for d in docs}) == 1
+    assert sf.fingerprint({'a': [{'b': 1}, {'b': 'x'}, {'b': 2}]}) != \
+        sf.fingerprint({'a': [{'b': 1}, {'b': 2}]})
+    uncached = core.SchemaFactory(cache_size=0)
+    for d in docs:
+        assert sf.process(d) == uncached.process(d)
+    assert len(sf._cache) == 1
+
+
+def test_parse_date():
+    import pendulum
+    for value in ('2017-08-18', '2017-08-18 10:00', '2016-02-29T23:59:59',
+                  '2017-08-18T10:00:00.5Z', '2017-08-18T10:00:00.1234567Z',
+                  '2017-08-18T10:00:00+02:00', '2017-08-18T10:00:00-0530',
+                  '20170818T100000'):
+        assert abs(core.parse_date(value) -
+                   pendulum.parse(value).timestamp()) < 1e-6, value
+    s = core.SchemaFactory().process({'fs': {'date': '2017-08-18'}})
+    assert s.timestamp == 1503014400.0
+    assert s.date == pendulum.parse('2017-08-18')
+    # the offset is not kept: dates are in UTC
+    s = core.SchemaFactory().process({'date': '2017-08-18T12:00:00+02:00'})
+    assert str(s.date) == '2017-08-18T10:00:00+00:00'
+
+
+def test_pickle_schema():
+    import pickle
+    s = core.SchemaFactory().process({'a': [{'b': 1}], 'c': 'x', 'time': 5})
+    assert not hasattr(s, '__dict__')
+    s2 = pickle.loads(pickle.dumps(s))
+    assert s2 == s and hash(s2) == hash(s)
+    assert s2.timestamp == 5.0 and s2.children == s.children
+    # keys are interned, so equal tables share their strings
+    assert s2.table[0][1] is s.table[0][1]
+
+
+def test_paths():
+    d = {'numbers': [{'num': 1, 'name': 'one'}, 'x'], 'fs': {'date': 'now'}}
+    paths = core.SchemaFactory().process(d).paths()
+    assert sorted(paths) == [
+        ('fs', 'dict'), ('fs.date', 'str'), ('numbers', 'array'),
+        ('numbers[]', 'dict'), ('numbers[]', 'str'),
+        ('numbers[].name', 'str'), ('numbers[].num', 'int')]
+
+
+def test_array_sample():
+    d1 = {'values': list(range(1000)) + ['end']}
+    d2 = {'values': list(range(1001))}
+    sf = core.SchemaFactory(array_limit=10)
+    assert sf.process(d1).table == sf.process(d2).table
+    # random picks are the same for arrays of the same length
+    sf = core.SchemaFactory(array_limit=10, array_extra=50)
+    picks = sf._array_items(list(range(1000)))
+    assert picks[:10] == list(range(10))
+    assert 10 < len(picks) <= 60
+    assert picks == sf._array_items(list(range(1000)))
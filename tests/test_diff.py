@@ -0,0 +1,42 @@
+"""
+Unit tests for .diff
+"""
+from alsdata import core
+from alsdata import diff
+
+
+def _schemas(*docs):
+    sf = core.SchemaFactory()
+    return [sf.process(d) for d in docs]
+
+
+def test_compare_full():
+    s1, s2 = _schemas({'a': 1, 'b': [1, 'x'], 'c': {'d': 1.5}},
+                      {'a': 'x', 'b': [1], 'e': 'y'})
+    assert not s1.compare(s2)
+    assert s1.compare(s2).added == []  # only for a full comparison
+    result = s1.compare(s2, full=True)
+    assert result.removed == [('c', ['dict']), ('c.d', ['float'])]
+    assert result.added == [('e', ['str'])]
+    assert result.retyped == [('a', ['int'], ['str']),
+                              ('b[]', ['int', 'str'], ['int'])]
+    assert result.to_dict()['retyped'][0] == {'path': 'a', 'types1': ['int'],
+                                              'types2': ['str']}
+    same = s1.compare(_schemas({'c': {'d': 2.5}, 'b': ['y', 2], 'a': 3})[0],
+                      full=True)
+    assert same and not (same.added or same.removed or same.retyped)
+
+
+def test_diff_schemas():
+    schemas = _schemas(*[{'k{:d}'.format(i): i, 'x': [i] * (i % 2)}
+                         for i in range(6)])
+    serial = list(diff.diff_schemas(schemas))
+    assert [(i, j) for i, j, _ in serial] == diff.schema_pairs(6)
+    assert len(serial) == 15
+    parallel = list(diff.diff_schemas(schemas, workers=2))
+    assert [(i, j, r.to_dict()) for i, j, r in serial] == \
+        [(i, j, r.to_dict()) for i, j, r in parallel]
+    adjacent = list(diff.diff_schemas(schemas, adjacent=True))
+    assert [(i, j) for i, j, _ in adjacent] == [(0, 1), (1, 2), (2, 3),
+                                                (3, 4), (4, 5)]
+    assert adjacent[0][2].added == [('k1', ['int']), ('x[]', ['int'])]
@@ -0,0 +1,82 @@
+"""
+Unit tests for .dump
+"""
+import bson
+from alsdata import dump
+
+
+def _write_bson(path, docs, garbage=b''):
+    data = [bson.BSON.encode(d) for d in docs]
+    with open(path, 'wb') as f:
+        f.write(data[0])
+        f.write(garbage)
+        for d in data[1:]:
+            f.write(d)
+    return data
+
+
+def test_bson_resync_and_offset(tmpdir):
+    docs = [{'_id': i, 'values': list(range(i))} for i in range(5)]
+    path = str(tmpdir.join('coll.bson'))
+    data = _write_bson(path, docs, garbage=b'\x07\x00\x00\x00junk')
+    # truncated last record
+    with open(path, 'ab') as f:
+        f.write(bson.BSON.encode({'_id': 99})[:-3])
+    found = list(dump.iter_documents(path))
+    assert [d for _, d in found] == docs
+    # resume at the offset just past the third document
+    offset = found[2][0]
+    rest = list(dump.iter_bson(path, offset=offset))
+    assert [d for _, d in rest] == docs[3:]
+    assert len(data[0]) == found[0][0]
+
+
+def test_bson_no_resync(tmpdir):
+    path = str(tmpdir.join('coll.bson'))
+    _write_bson(path, [{'a': 1}, {'b': 2}], garbage=b'\xff' * 8)
+    try:
+        list(dump.iter_bson(path, resync=False))
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def test_json_lines(tmpdir):
+    path = tmpdir.join('coll.json')
+    path.write('{"_id": {"$oid": "59a0b44a1d41c81e3c0f6a1b"}, "a": 1}\n'
+               'not json\n'
+               '\n'
+               '{"_id": 2, "b": [1, 2]}\n')
+    found = list(dump.iter_documents(str(path)))
+    assert [d['_id'] for _, d in found] == [
+        bson.ObjectId('59a0b44a1d41c81e3c0f6a1b'), 2]
+    # offset in the middle of the first line starts at the next one
+    found = list(dump.iter_json_lines(str(path), offset=3))
+    assert [d['_id'] for _, d in found] == [2]
+
+
+def test_bson_events(tmpdir):
+    doc = {'_id': bson.ObjectId(), 'time': 10, 'a': [1.5, 2.5, 'x', 3.5],
+           'b': {'c': True, 'd': [{'e': 1}, [2]]}, 'f': bson.Int64(1)}
+    events = list(dump.bson_events(bson.BSON.encode(doc)))
+    assert events == [('_id', None), ('time', 'int'), ('a', 'array'),
+                      ('', 'float'), ('', 'str'), None,
+                      ('b', 'dict'), ('c', 'int'), ('d', 'array'),
+                      ('', 'dict'), ('e', 'int'), None,
+                      ('', 'array'), ('', 'int'), None, None, None,
+                      ('f', 'int')]
+    data = bson.BSON.encode(doc)
+    assert dump.bson_fields(data, ('_id', 'b', 'x')) == {
+        '_id': doc['_id'], 'b': doc['b']}
+    try:
+        list(dump.bson_events(data[:20]))
+    except bson.errors.InvalidBSON:
+        pass
+    else:
+        assert False, 'Expected InvalidBSON'
+    # raw records from a dump file
+    path = str(tmpdir.join('coll.bson'))
+    _write_bson(path, [doc, {'_id': 2}])
+    found = list(dump.iter_bson(path, raw=True))
+    assert [d for _, d in found] == [data, bson.BSON.encode({'_id': 2})]
@@ -0,0 +1,32 @@
+"""
+Unit tests for .generate
+"""
+from alsdata import generate
+from .helpers import schema_set
+
+
+def test_same_seed():
+    docs1 = list(generate.DocumentGenerator(seed=3).documents(50))
+    docs2 = list(generate.DocumentGenerator(seed=3).documents(50))
+    docs3 = list(generate.DocumentGenerator(seed=4).documents(50))
+    assert docs1 == docs2
+    assert docs1 != docs3
+    assert [d['_id'] for d in docs1] == list(range(50))
+
+
+def test_number_of_shapes():
+    for kw in ({}, {'nested_arrays': False}, {'depth': 1, 'width': 4},
+               {'depth': 4, 'width': 10, 'array_len': 2}):
+        gen = generate.DocumentGenerator(shapes=12, **kw)
+        ss = schema_set(gen.documents(2000))
+        assert len(ss) == 12, kw
+
+
+def test_depth():
+    for depth in (1, 2, 4):
+        gen = generate.DocumentGenerator(depth=depth, nested_arrays=False)
+        ss = schema_set(gen.documents(20))
+        # not counting the extra level of the items of scalar arrays
+        assert max(row[0] for s in ss for row in s.table if row[1]) == \
+            depth - 1
+
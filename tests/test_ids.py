@@ -0,0 +1,79 @@
+"""
+Unit tests for .ids
+"""
+import random
+from bson import ObjectId
+from alsdata import ids
+
+
+def _fill(spec, values):
+    store = ids.store_factory(spec, rng=random.Random(42))()
+    for v in values:
+        store.append(v)
+    return store
+
+
+def test_full_compact():
+    oids = [ObjectId() for _ in range(100)]
+    store = _fill('full', oids)
+    assert len(store) == 100
+    assert store.retained() == oids
+    assert store.head(2) == oids[:2] and store.tail(1) == oids[-1:]
+    assert isinstance(store._data, bytearray)
+    assert len(store._data) == 12 * 100
+    # mixed types fall back to a list
+    store = _fill('full', [1, 2, 'three'])
+    assert store.retained() == [1, 2, 'three']
+
+
+def test_policies():
+    values = list(range(1000))
+    ends = _fill('ends:3', values)
+    assert len(ends) == 1000
+    assert ends.retained() == [0, 1, 2, 997, 998, 999]
+    assert _fill('ends:3', values[:4]).retained() == [0, 1, 2, 3]
+    sample = _fill('sample:10', values)
+    assert len(sample) == 1000 and len(sample.retained()) == 10
+    assert set(sample.retained()) <= set(values)
+    count = _fill('count', values)
+    assert len(count) == 1000 and count.retained() == []
+
+
+def test_merge():
+    for spec in 'full', 'ends:3', 'sample:5', 'count':
+        a, b = _fill(spec, range(10)), _fill(spec, range(10, 30))
+        a.merge(b)
+        assert len(a) == 30
+        if spec == 'full':
+            assert a.retained() == list(range(30))
+        elif spec == 'ends:3':
+            assert a.retained() == [0, 1, 2, 27, 28, 29]
+        elif spec == 'sample:5':
+            assert len(set(a.retained())) == 5
+
+
+def test_to_dict():
+    for spec in 'full', 'ends:2', 'sample:3', 'count':
+        store = _fill(spec, [ObjectId() for _ in range(7)])
+        copy = ids.store_from_dict(ids.store_to_dict(store))
+        assert len(copy) == len(store)
+        assert copy.retained() == store.retained()
+
+
+def test_bad_policy():
+    for spec in 'all', 'ends:x', 'sample:0', 'count:3':
+        try:
+            ids.store_factory(spec)
+        except ValueError:
+            pass
+        else:
+            assert False, 'Expected ValueError for ' + spec
+
+
+def test_abstract():
+    try:
+        ids.IdStore()
+    except TypeError:
+        pass
+    else:
+        assert False, 'Expected TypeError'
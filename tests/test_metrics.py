@@ -0,0 +1,83 @@
+"""
+Unit tests for .metrics
+"""
+import json
+import os
+import pickle
+import pstats
+from alsdata import core
+from alsdata import metrics
+
+
+def _records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_scan_metrics(tmpdir):
+    path = str(tmpdir.join('metrics.jsonl'))
+    sink = metrics.MetricsSink(path, interval=1e-9)
+    scan = sink.scan('coll')
+    scan.new_schema(1, 1)
+    scan.update(10, fetch=0.5, process=1.0, add=0.25)
+    scan.new_schema(12, 2)
+    scan.add_bytes(100)
+    scan.update(20, fetch=0.5, process=1.0, add=0.25)
+    scan.add_time('report', 2.0)
+    rec = scan.finish()
+    sink.close()
+    recs = _records(path)
+    assert [r['event'] for r in recs] == ['progress', 'progress', 'done']
+    assert recs[-1] == json.loads(json.dumps(rec))
+    assert [r['docs'] for r in recs] == [10, 20, 20]
+    assert rec['bytes'] == 100 and rec['schemas'] == 2
+    assert rec['times'] == {'fetch': 1.0, 'process': 2.0, 'add': 0.5,
+                            'report': 2.0}
+    assert rec['growth'] == [(1, 1), (12, 2)]
+    # with the default interval, only the final record
+    quiet = metrics.MetricsSink(path).scan('coll2')
+    quiet.update(5)
+    quiet.finish()
+    quiet.sink.close()
+    assert [r['name'] for r in _records(path)][3:] == ['coll2']
+
+
+def test_pickle_sink(tmpdir):
+    path = str(tmpdir.join('metrics.jsonl'))
+    sink = metrics.MetricsSink(path, interval=5)
+    sink.emit({'event': 'test'})
+    copy = pickle.loads(pickle.dumps(sink.scan('coll')))
+    assert copy.sink.path == path and copy.sink.interval == 5
+    copy.finish()
+    sink.close()
+    copy.sink.close()
+    assert [r['event'] for r in _records(path)] == ['test', 'done']
+
+
+def _work():
+    sf = core.SchemaFactory(cache_size=0)
+    for i in range(2000):
+        sf.process({'a': [i, {'b': str(i)}], 'c': {'d': float(i)}})
+
+
+def test_profiled(tmpdir):
+    prefix = str(tmpdir.join('prof'))
+    path = metrics.profile_path(prefix, 'db/coll 1')
+    assert os.path.basename(path) == 'prof-db_coll_1.prof'
+    with metrics.profiled(path):
+        _work()
+    funcs = {f[2] for f in pstats.Stats(path).stats}
+    assert '_process_dict' in funcs
+    path = metrics.profile_path(prefix, 'coll', profiler='sample')
+    with metrics.profiled(path, profiler='sample'):
+        _work()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert metrics.profile_path(None, 'coll') is None
+    try:
+        metrics.profiled(path, profiler='other')
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
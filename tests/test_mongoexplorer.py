@@ -0,0 +1,320 @@
+"""
+Unit tests for bin/mongoexplorer, against an in-memory MongoDB (mongomock)
+"""
+import datetime
+import glob
+import importlib.machinery
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+import bson
+import mongomock
+from bson import ObjectId
+from alsdata import core, report
+
+_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'bin',
+                     'mongoexplorer')
+
+
+def _load_script():
+    loader = importlib.machinery.SourceFileLoader('mongoexplorer', _PATH)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    # worker processes find their functions by module name
+    sys.modules[loader.name] = module
+    loader.exec_module(module)
+    return module
+
+
+mex = _load_script()
+
+
+def _db(monkeypatch, colls):
+    """Database "als" with the collections in the dict `colls`; new
+    connections, e.g. those of worker processes, see the same data.
+    """
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(mex, 'MongoClient',
+                        lambda *args, **kw: mongomock.MongoClient(
+                            _store=client._store))
+    db = client.get_database('als')
+    for name, docs in colls.items():
+        db.get_collection(name).insert_many(docs)
+    return db
+
+
+def _docs(n, start=0):
+    return [{'_id': i, 'time': i, 'a': i % 3 and 'x' or i,
+             'b': [{'c': 1}] * (i % 2)} for i in range(start, start + n)]
+
+
+def _tables(schemas):
+    return sorted((s.table, len(ids)) for _, s, ids in schemas.items_bydate())
+
+
+def test_scan_documents():
+    found, n = mex.scan_documents(enumerate(_docs(30)),
+                                  mex.ProgressMeterBase(),
+                                  high_water='time')
+    assert n == 30 and len(found) == 4
+    assert found.meta['high_water'] == 29
+    try:
+        mex.scan_documents(enumerate([{'_id': 1, 'a': None}]),
+                           mex.ProgressMeterBase())
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def _write_bson(path, docs):
+    with open(path, 'wb') as f:
+        for doc in docs:
+            f.write(doc if isinstance(doc, bytes) else bson.BSON.encode(doc))
+
+
+def test_stream(tmpdir):
+    good, bad = str(tmpdir.join('good.bson')), str(tmpdir.join('bad.bson'))
+    _write_bson(good, _docs(10))
+    # a record with a field of unknown BSON type is skipped
+    broken = bytearray(bson.BSON.encode({'_id': 10, 'c': 1}))
+    broken[broken.index(b'c\x00') - 1] = 0x20
+    _write_bson(bad, _docs(10)[:5] + [bytes(broken)] + _docs(10)[5:])
+    found = mex.extract_schemas_from_file(bad, stream=True)
+    assert _tables(found) == _tables(mex.extract_schemas_from_file(good))
+    # values of types that schemas do not have are errors, as when decoded
+    for value in (datetime.datetime(2020, 1, 1), None, ObjectId()):
+        _write_bson(bad, [{'_id': 1, 'a': 1}, {'_id': 2, 'a': [value]}])
+        for stream in (False, True):
+            try:
+                mex.extract_schemas_from_file(bad, stream=stream)
+            except ValueError:
+                pass
+            else:
+                assert False, 'Expected ValueError'
+
+
+def test_extract_schemas_parallel(monkeypatch):
+    docs = _docs(100)
+    db = _db(monkeypatch, {'ints': docs,
+                           'mixed': docs[:50] + [
+                               dict(d, _id=str(d['_id'])) for d in docs[50:90]]
+                           + [dict(d, _id=ObjectId()) for d in docs[90:]]})
+    coll = db.get_collection('ints')
+    assert mex.id_ranges(coll, 4) == [(None, 25), (25, 50), (50, 75),
+                                      (75, None)]
+    serial = mex.extract_schemas(coll)
+    found = mex.extract_schemas_parallel(coll, (None, None), 4)
+    assert _tables(found) == _tables(serial)
+    found = mex.extract_schemas_parallel(coll, (None, None), 3,
+                                         query={'time': {'$gte': 40}})
+    assert sum(len(ids) for ids in found.schemas.values()) == 60
+    # range queries would miss the string and ObjectId ids
+    coll = db.get_collection('mixed')
+    assert mex.id_ranges(coll, 4) == [(None, None)]
+    found = mex.extract_schemas_parallel(coll, (None, None), 4)
+    assert _tables(found) == _tables(serial)
+
+
+def test_parallel_matches_serial(monkeypatch, tmpdir):
+    docs = _docs(200)
+    random.Random(2).shuffle(docs)
+    db = _db(monkeypatch, {'shuffled': docs})
+    outs, saved = [], []
+    for workers in 0, 4:
+        path = str(tmpdir.join('snap{:d}'.format(workers)))
+        outs.append(io.StringIO())
+        mex.process_collection(db, 'shuffled', outs[-1], workers=workers,
+                               conn_args=(None, None), save=path,
+                               reporter_class=report.TextReport)
+        saved.append([(dates, s.table, list(ids)) for dates, s, ids in
+                      core.SchemaSet.load(path).items_bydate()])
+    assert saved[0] == saved[1]
+    assert all(ids == sorted(ids) for _, _, ids in saved[0])
+    assert outs[0].getvalue() == outs[1].getvalue()
+
+
+def test_incremental(monkeypatch, tmpdir):
+    db = _db(monkeypatch, {'scans': _docs(20)})
+    state = str(tmpdir.join('state'))
+    kw = {'reporter_class': report.TextReport, 'incremental': state,
+          'progress': True}
+    mex.process_collection(db, 'scans', io.StringIO(), **kw)
+    assert core.SchemaSet.load(state).meta['high_water'] == 19
+    db.get_collection('scans').insert_many(_docs(15, start=20) + [
+        {'_id': 35, 'time': 35, 'new': 1}])
+    out = io.StringIO()
+    mex.process_collection(db, 'scans', out, **kw)
+    saved = core.SchemaSet.load(state)
+    assert saved.meta['high_water'] == 35
+    assert _tables(saved) == _tables(mex.extract_schemas(
+        db.get_collection('scans')))
+    assert out.getvalue().count('# Count = ') == 5
+
+
+def test_sampling(monkeypatch):
+    db = _db(monkeypatch, {'arrs': [{'_id': i, 'a': [i, i, 'x'],
+                                     'b': {'c': [1.5, 2.5, i]}}
+                                    for i in range(200)]})
+    coll = db.get_collection('arrs')
+    found = mex.extract_schemas(coll, sample_rate=0.25)
+    assert sum(len(ids) for ids in found.schemas.values()) == 50
+    assert found.meta['sampled'] == 'random 25% of records'
+    # mongomock reads a projection with only $slice as an inclusion, so
+    # arrays are only cut by the server together with $sample here
+    for kw in ({'array_sample': (2, 0)},
+               {'array_sample': (2, 1), 'slice_paths': ['a', 'b.c'],
+                'sample_rate': 1}):
+        found = mex.extract_schemas(coll, **kw)
+        assert _tables(found) == [(((0, 'a', 'array', -1),
+                                    (0, 'b', 'dict', -1),
+                                    (1, '', 'int', 0),
+                                    (1, 'c', 'array', 1),
+                                    (2, '', 'float', 3)), 200)]
+    found = mex.extract_schemas(coll, array_sample=(2, 1))
+    assert (1, '', 'str', 0) in _tables(found)[0][0]
+    assert mex.array_paths(coll) == ['a', 'b.c']
+    out = io.StringIO()
+    mex.process_collection(db, 'arrs', out, reporter_class=report.TextReport,
+                           slice_arrays=True, array_sample=(2, 1),
+                           sample_rate=0.5)
+    assert '# Sampled: random 50% of records; first 2 + 1 random items of ' \
+           'each array (top-level arrays cut by the server)\n' in \
+           out.getvalue()
+    try:
+        _main(monkeypatch, '-c', 'arrs', '--slice')
+    except SystemExit as err:
+        assert err.code == 2
+    else:
+        assert False, 'Expected SystemExit'
+
+
+def _main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['mongoexplorer', '-d', 'als'] +
+                        list(args))
+    return mex.main()
+
+
+def test_process_collections(monkeypatch, tmpdir):
+    db = _db(monkeypatch, {'a': _docs(10), 'b': _docs(40), 'c': _docs(5)})
+    meters = []
+
+    def meter(*args, **kw):
+        meters.append(args)
+        return mex.ProgressMeterBase()
+
+    monkeypatch.setattr(mex, 'ProgressMeter', meter)
+    out1, out3 = io.StringIO(), io.StringIO()
+    mex.process_collections(db, ['a', 'b', 'c'], out1, progress=True,
+                            reporter_class=report.TextReport)
+    assert len(meters) == 3
+    mex.process_collections(db, ['a', 'b', 'c'], out3, jobs=3,
+                            progress=True, reporter_class=report.TextReport)
+    assert len(meters) == 3  # no progress meters in concurrent threads
+    assert out3.getvalue() == out1.getvalue()
+    assert out1.getvalue().count('| Collection: ') == 3
+    # all collections, from the command line
+    path = str(tmpdir.join('out.txt'))
+    assert _main(monkeypatch, '-c', '*', '-j', '2', '-o', path) == 0
+    with open(path) as f:
+        assert f.read() == out1.getvalue()
+    try:
+        _main(monkeypatch, '-c', '*', '-j', '2', '-w', '2')
+    except SystemExit as err:
+        assert err.code == 2
+    else:
+        assert False, 'Expected SystemExit'
+
+
+def _done(path):
+    with open(path) as f:
+        recs = [json.loads(line) for line in f]
+    return {r['name']: r for r in recs if r['event'] == 'done'}
+
+
+def test_metrics(monkeypatch, tmpdir):
+    docs = _docs(60) + [{'_id': i, 'time': i, 'new': i}
+                        for i in range(60, 80)]
+    _db(monkeypatch, {'scans': docs})
+    serial, parallel = str(tmpdir.join('m1')), str(tmpdir.join('m2'))
+    prefix = str(tmpdir.join('prof'))
+    assert _main(monkeypatch, '-c', 'scans', '-o', os.devnull,
+                 '--metrics', serial) == 0
+    assert _main(monkeypatch, '-c', 'scans', '-o', os.devnull, '-w', '3',
+                 '--metrics', parallel, '--profile', prefix,
+                 '--profiler', 'sample') == 0
+    # the sink is closed, so the records are complete
+    rec1, rec2 = _done(serial)['scans'], _done(parallel)['scans']
+    assert rec1['docs'] == rec2['docs'] == 80
+    assert rec1['schemas'] == rec2['schemas'] == 5
+    assert rec2['growth'] == rec1['growth'] == [
+        [1, 1], [2, 2], [3, 3], [4, 4], [61, 5]]
+    assert rec2['times']['process'] > 0 and rec2['times']['fetch'] > 0
+    # one profile per worker
+    assert len(glob.glob(prefix + '-*-scans.folded')) == 3
+
+
+def test_multiple(monkeypatch, tmpdir, capsys):
+    _db(monkeypatch, {'scans': _docs(30)})
+    cat = str(tmpdir.join('cat.db'))
+    assert _main(monkeypatch, '-c', 'scans', '-m', str(tmpdir), '-o', 'r',
+                 '-C', cat) == 0
+    with open(str(tmpdir.join('r-meta.csv'))) as f:
+        meta = f.read().splitlines()
+    assert meta[0] == 'count,file,ids' and len(meta) == 5
+    for line in meta[1:]:
+        count, path, _ = line.split(',', 2)
+        with open(path.strip('"')) as f:
+            assert f.read().startswith('- a: ')
+    assert sorted(int(line.split(',')[0]) for line in meta[1:]) == [
+        5, 5, 10, 10]
+    # catalog queries go to stdout
+    assert _main(monkeypatch, '-m', str(tmpdir), '-o', 'r', '-C', cat,
+                 '-Q', 'b[].c') == 0
+    out = capsys.readouterr().out
+    assert '# 2 matching schemas' in out and 'als.scans schema' in out
+
+
+def test_validate(monkeypatch, tmpdir, capsys):
+    db = _db(monkeypatch, {'scans': _docs(20)})
+    snap = str(tmpdir.join('snap'))
+    assert _main(monkeypatch, '-c', 'scans', '-o', os.devnull,
+                 '-S', snap) == 0
+    assert _main(monkeypatch, '-c', 'scans', '-V', snap) == 0
+    assert capsys.readouterr().out == ''
+    db.get_collection('scans').insert_many([
+        {'_id': 20, 'time': 20, 'a': 1.5, 'b': []},
+        {'_id': 21, 'time': 21, 'a': 'x', 'b': [], 'c': 1}])
+    assert _main(monkeypatch, '-c', 'scans', '-V', snap) == 1
+    assert capsys.readouterr().out == '20: ~a (int -> float)\n' \
+                                      '21: +c (int)\n'
+    v = mex.validate_documents(db.get_collection('scans').find(),
+                               core.SchemaSet.load(snap), io.StringIO())
+    assert (v.docs, v.failed) == (22, 2)
+    out = io.StringIO()
+    mex.validate_documents(db.get_collection('scans').find({'_id': 21}),
+                           core.SchemaSet.load(snap), out, fmt='json')
+    assert json.loads(out.getvalue())['id'] == 21
+
+
+def test_load_mixed_policies(monkeypatch, tmpdir, capsys):
+    paths = []
+    for policy in 'full', 'count':
+        found = mex.scan_documents(enumerate(_docs(10)),
+                                   mex.ProgressMeterBase(),
+                                   id_policy=policy)[0]
+        paths.append(str(tmpdir.join(policy)))
+        found.save(paths[-1])
+    assert _main(monkeypatch, '-L', paths[1], paths[0]) == 0
+    capsys.readouterr()
+    try:
+        _main(monkeypatch, '-L', paths[0], paths[1])
+    except SystemExit as err:
+        assert err.code == 2
+    else:
+        assert False, 'Expected SystemExit'
+    assert 'Cannot merge snapshot "{}"'.format(paths[1]) in \
+        capsys.readouterr().err
@@ -0,0 +1,41 @@
+"""
+Unit tests for .reader
+"""
+import bson
+from bson.raw_bson import RawBSONDocument
+from alsdata import reader
+
+
+def test_prefetch():
+    items = list(range(2500))
+    rdr = reader.PrefetchReader(iter(items), batch_size=100, prefetch=2)
+    assert list(rdr) == items
+    assert rdr.batches == 25
+    assert set(rdr.timings) == {'fetch', 'decode', 'wait'}
+
+
+def test_decode_raw():
+    docs = [{'_id': i, 'a': [i, str(i)]} for i in range(10)]
+    raw = [RawBSONDocument(bson.BSON.encode(d)) for d in docs]
+    rdr = reader.PrefetchReader(raw, batch_size=3, decode=reader.decode_raw)
+    assert list(rdr) == docs
+
+
+def _failing():
+    yield 1
+    raise ValueError('broken cursor')
+
+
+def test_errors_and_early_stop():
+    try:
+        list(reader.PrefetchReader(_failing(), batch_size=1))
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+    # stopping early does not hang on the background threads
+    rdr = reader.PrefetchReader(iter(range(10 ** 6)), batch_size=10,
+                                prefetch=1)
+    for i in rdr:
+        if i == 15:
+            break
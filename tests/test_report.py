@@ -0,0 +1,85 @@
+"""
+Unit tests for .report
+"""
+from six import StringIO
+from alsdata import core
+from alsdata import report
+
+
+def _render(reporter_class, schema):
+    strm = StringIO()
+    reporter_class(strm).write_schema(schema)
+    return strm.getvalue()
+
+
+def test_child_index():
+    d = {'fs': {'date': '2017-08-18', 'size': 1},
+         'numbers': [{'num': 1}, 'a']}
+    s = core.SchemaFactory().process(d)
+    _parent = core.Schema.Column.PARENT_IDX
+    assert s.roots == [i for i, row in enumerate(s.table) if row[_parent] < 0]
+    for i, kids in enumerate(s.children):
+        assert kids == [j for j, row in enumerate(s.table)
+                        if row[_parent] == i]
+
+
+def test_text_report():
+    d = {'fs': {'date': '2017-08-18', 'size': 1},
+         'numbers': [{'num': 1}, 'a']}
+    s = core.SchemaFactory().process(d)
+    # note: nesting of top-level rows after the first container is
+    # as in the original output
+    assert _render(report.TextReport, s) == (
+        '- fs{}\n'
+        '    - date: str\n'
+        '    - size: int\n'
+        '    - numbers[]\n'
+        '        - {}\n'
+        '            - num: int\n'
+        '        - str\n')
+
+
+def test_wide_schema():
+    d = {'k{:04d}'.format(i): {'v': [i, {'w': 'x'}]} for i in range(2000)}
+    s = core.SchemaFactory().process(d)
+    text = _render(report.TextReport, s)
+    assert text.count('- v[]') == 2000
+    json_text = _render(report.JsonSchemaReport, s)
+    assert json_text.count('"v": {') == 2000
+
+
+class _CountingStream(StringIO):
+    writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return StringIO.write(self, s)
+
+
+def test_buffered_write():
+    d = {'a': 1, 'b': [{'c': 'x'}, 2], 'd': {'e': 1.5}}
+    s = core.SchemaFactory().process(d)
+    for cls in report.TextReport, report.JsonSchemaReport:
+        strm = _CountingStream()
+        reporter = cls(strm)
+        reporter.write_schema(s)
+        assert strm.writes == 1
+        assert reporter.render(s) == strm.getvalue()
+        assert strm.writes == 1
+
+
+def test_file_writer(tmpdir):
+    paths = [str(tmpdir.join('f{:d}'.format(i))) for i in range(20)]
+    with report.FileWriter(workers=3, pending=2) as writer:
+        for i, path in enumerate(paths):
+            writer.write(path, 'x' * i)
+    for i, path in enumerate(paths):
+        assert open(path).read() == 'x' * i
+    writer = report.FileWriter()
+    writer.write(str(tmpdir.join('nodir', 'f')), 'x')
+    try:
+        writer.close()
+    except IOError:
+        pass
+    else:
+        assert False, 'Expected IOError'
@@ -0,0 +1,91 @@
+"""
+Unit tests for .stats
+"""
+from six import StringIO
+from alsdata import core
+from alsdata import report
+from alsdata import stats
+
+
+def test_hyperloglog():
+    h1, h2 = stats.HyperLogLog(), stats.HyperLogLog()
+    assert h1.count() == 0
+    for i in range(20000):
+        (h1 if i % 2 else h2).add(i)
+        h2.add('x{:d}'.format(i % 100))
+    assert abs(h1.count() - 10000) < 500
+    h1.merge(h2)
+    assert abs(h1.count() - 20100) < 1000
+    h3 = stats.HyperLogLog.from_dict(h1.to_dict())
+    assert h3.count() == h1.count()
+
+
+def _docs():
+    return [{'_id': i, 'a': i % 3, 'b': [{'c': 'x'}, i * 0.5],
+             'd': {'e': 'y'} if i % 2 else 'z'} for i in range(100)]
+
+
+def test_field_stats():
+    fs = stats.FieldStats()
+    sf = core.SchemaFactory(stats=fs)
+    paths = set()
+    for d in _docs():
+        paths.update(p for p, _ in sf.process(d).paths())
+    assert set(fs.paths) == paths
+    assert fs.count == 100
+    assert fs.summary('a') == {'count': 100, 'fraction': 1.0,
+                               'types': {'int': 100}, 'distinct': 3}
+    assert fs.summary('b[]')['types'] == {'dict': 100, 'float': 100}
+    assert fs.summary('d.e')['count'] == 50
+    assert fs.summary('d')['types'] == {'dict': 50, 'str': 50}
+    assert 'distinct' not in fs.summary('b')
+    assert fs.summary('nope') is None
+
+
+def test_deep_document():
+    # deeper than the recursion limit
+    d = {'x': 1}
+    for i in range(1500):
+        d = {'a': [d]} if i % 2 else {'a': d, 'n': i}
+    fs = stats.FieldStats()
+    s = core.SchemaFactory(stats=fs).process(d)
+    assert set(fs.paths) == set(p for p, _ in s.paths())
+    deepest = '.'.join(['a[]', 'a'] * 750) + '.x'
+    assert fs.summary(deepest)['types'] == {'int': 1}
+
+
+def test_merge_and_snapshot(tmpdir):
+    docs = _docs()
+    parts = []
+    for chunk in docs[:40], docs[40:]:
+        ss = core.SchemaSet()
+        ss.stats = stats.FieldStats()
+        sf = core.SchemaFactory(stats=ss.stats)
+        for d in chunk:
+            ss.add(sf.process(d), d['_id'])
+        parts.append(ss)
+    merged = core.SchemaSet()
+    for ss in parts:
+        merged.merge(ss)
+    assert merged.stats.count == 100
+    assert merged.stats.summary('b[].c')['count'] == 100
+    path = str(tmpdir.join('snap.gz'))
+    merged.save(path)
+    loaded = core.SchemaSet.load(path)
+    for p in merged.stats.paths:
+        assert loaded.stats.summary(p) == merged.stats.summary(p)
+
+
+def test_report_notes():
+    fs = stats.FieldStats()
+    s = core.SchemaFactory(stats=fs).process({'a': 1, 'b': [2]})
+    strm = StringIO()
+    report.TextReport(strm, stats=fs).write_schema(s)
+    assert strm.getvalue() == (
+        '- a: int  [1 records (100.0%); int:1; ~1 distinct]\n'
+        '- b[]  [1 records (100.0%); array:1]\n'
+        '    - int  [1 records (100.0%); int:1; ~1 distinct]\n')
+    strm = StringIO()
+    report.JsonSchemaReport(strm, stats=fs).write_schema(s)
+    assert '"a": { "type": "int", "x-stats": {"count": 1, "distinct": 1, ' \
+           '"fraction": 1.0, "types": {"int": 1}}}' in strm.getvalue()
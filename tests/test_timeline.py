@@ -0,0 +1,77 @@
+"""
+Unit tests for .timeline
+"""
+from alsdata import core
+from alsdata import timeline
+from .helpers import schema_set
+
+DAY = 86400
+
+
+def _docs():
+    # "a" from day 0 to 9, "b" is added on day 5, "c" on days 3 and 20
+    docs = [{'_id': i, 'time': i * DAY + 60, 'a': 1} for i in range(5)]
+    docs += [{'_id': i, 'time': i * DAY, 'a': 1, 'b': 'x'}
+             for i in range(5, 10)]
+    docs += [{'_id': 10, 'time': 3 * DAY, 'c': [1]},
+             {'_id': 11, 'time': 20 * DAY + 1, 'c': [2]}]
+    return docs
+
+
+def test_buckets():
+    tl = timeline.Timeline(unit='week')
+    # 1970-01-05 was the first Monday after the epoch
+    assert tl.bucket(4 * DAY - 1) == 0
+    assert tl.bucket(4 * DAY) == 1
+    assert tl.bucket_start(1) == 4 * DAY
+    assert timeline.Timeline(unit='hour').bucket(7200) == 2
+    try:
+        timeline.Timeline(unit='month')
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def test_index():
+    ss = schema_set(_docs(), timeline='day')
+    s_a, s_ab, s_c = [s for _, s, _ in ss.items_bydate()]
+    assert ss.timeline.histogram(s_c) == [(3, 1), (20, 1)]
+    index = timeline.TimelineIndex(ss)
+    assert index.live(0, DAY) == {s_a: 1}
+    assert index.live(3 * DAY, 6 * DAY) == {s_a: 2, s_ab: 1, s_c: 1}
+    assert index.live(10 * DAY, 20 * DAY) == {}
+    assert index.live(10 * DAY, 30 * DAY) == {s_c: 1}
+    assert index.first_seen('b') == 5 * DAY
+    assert index.first_seen('a') == 60
+    assert index.last_seen('a') == 9 * DAY
+    assert index.first_seen('c[]') == 3 * DAY
+    assert index.first_seen('d') is None
+    assert sorted(index.paths()) == ['a', 'b', 'c', 'c[]', 'time']
+
+
+def test_merge_and_snapshot(tmpdir):
+    docs = _docs()
+    whole = schema_set(docs, timeline='day')
+    parts = schema_set(docs[:6], timeline='day')
+    parts.merge(schema_set(docs[6:], timeline='day'))
+    order = [s for _, s, _ in whole.items_bydate()]
+    assert [s for _, s, _ in parts.items_bydate()] == order
+    for s in order:
+        assert parts.timeline.histogram(s) == whole.timeline.histogram(s)
+    path = str(tmpdir.join('snap.json.gz'))
+    whole.save(path)
+    loaded = core.SchemaSet.load(path)
+    assert loaded.timeline.unit == 'day'
+    for s in order:
+        assert loaded.timeline.histogram(s) == whole.timeline.histogram(s)
+
+
+def test_bydate_order_updates():
+    ss = schema_set(_docs(), timeline='day')
+    order = [s for _, s, _ in ss.items_bydate()]
+    # schemas are in order of their latest date, which has changed
+    late = core.SchemaFactory().process({'_id': 12, 'time': 30 * DAY,
+                                         'a': 1})
+    ss.add(late, 12)
+    assert [s for _, s, _ in ss.items_bydate()] == order[1:] + order[:1]
@@ -0,0 +1,106 @@
+"""
+Unit tests for .validate
+"""
+import collections
+import random
+from bson import ObjectId
+from alsdata import core
+from alsdata import generate
+from alsdata import validate
+from .helpers import schema_set
+
+
+def _validator(docs, **kw):
+    return validate.Validator(schema_set(docs), **kw)
+
+
+def test_check():
+    v = _validator([{'_id': 1, 'a': 1, 'b': [{'c': 'x'}, {'d': 1.5}]},
+                    {'_id': 2, 'a': 'x'}])
+    assert v.check({'_id': ObjectId(), 'a': 2,
+                    'b': [{'c': 'y'}, {'d': 2.5}, {'c': 'z'}]}) is None
+    assert v.check({'_id': 3, 'a': 'y'}) is None
+    # closest known schema is the first one
+    result = v.check({'_id': 4, 'a': 1, 'b': [{'c': 1}, {'d': 1.5}],
+                      'e': 'new'})
+    assert not result
+    assert result.added == [('e', ['str'])]
+    assert result.removed == []
+    assert result.retyped == [('b[].c', ['str'], ['int'])]
+    assert v.check({'_id': 5, 'a': [1]}).retyped == [('a', ['str'],
+                                                      ['array'])]
+    assert (v.docs, v.failed, v.new_shapes) == (4, 2, 2)
+
+
+def test_validate():
+    docs = list(generate.DocumentGenerator(seed=1, shapes=5).documents(500))
+    v = _validator(docs[:400], cache_size=2)
+    assert list(v.validate(docs[400:])) == []
+    bad = list(v.validate([{'_id': 'x', 'time': 1}] + docs[:10]))
+    assert [id_ for id_, _ in bad] == ['x']
+    assert bad[0][1].added == []
+    assert v.docs == 111 and v.failed == 1
+    try:
+        v.check({'_id': 'y', 'a': object()})
+    except ValueError:
+        pass
+    else:
+        assert False, 'Expected ValueError'
+
+
+def test_verdict_cache():
+    v = _validator([{'_id': 0, 'a': [{'b': 1}], 'c': [1]}])
+    docs = [{'_id': i, 'a': [{'b': j} for j in range(i)],
+             'c': list(range(i))} for i in range(1, 50)]
+    assert list(v.validate(docs)) == []
+    # one verdict per fingerprint, whatever the length of the arrays
+    assert len(v._verdicts) == 1
+    # documents too deep for the matcher are keyed by their fingerprint,
+    # and those with fingerprints too long to keep are checked all the same
+    v.MAX_DEPTH = 1
+    v._factory.FINGERPRINT_MAX = 4
+    assert v.check(docs[5]) is None
+    assert v.check({'_id': 'x', 'a': [{'b': 'y'}], 'c': [2]}).retyped == [
+        ('a[].b', ['int'], ['str'])]
+    assert len(v._verdicts) == 1
+
+
+def _random_value(rng, depth):
+    r = rng.random()
+    if depth > 2 or r < 0.6:
+        return rng.choice([1, True, 1.5, 'x'])
+    if r < 0.8:
+        return [_random_value(rng, depth + 1)
+                for _ in range(rng.randint(0, 3))]
+    return _random_doc(rng, depth + 1)
+
+
+def _random_doc(rng, depth=0):
+    keys = rng.sample('abc', rng.randint(0, 3))
+    doc = {k: _random_value(rng, depth) for k in keys}
+    if rng.random() < 0.2:
+        doc['_id'] = rng.choice([1, ObjectId(), {'x': 1}])
+    if rng.random() < 0.05:
+        doc['o'] = collections.OrderedDict(a=1)
+    return doc
+
+
+def test_shape_ids():
+    # documents with the same shape id have the same schema, and the
+    # verdicts are those of the schemas
+    rng = random.Random(1)
+    docs = [_random_doc(rng) for _ in range(3000)]
+    sf = core.SchemaFactory(cache_size=0)
+    known = schema_set(docs[:300])
+    v = validate.Validator(known)
+    schemas, shared = {}, 0
+    for doc in docs:
+        s = sf.process(doc)
+        key = v._dict_id(doc, 0)
+        if key in schemas:
+            assert schemas[key] == s
+            shared += 1
+        elif key is not None:
+            schemas[key] = s
+        assert (v.check(doc) is None) == (s in known)
+    assert shared > len(docs) // 3